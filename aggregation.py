@@ -0,0 +1,77 @@
+"""Masked matches covering the neighbor colors of a switch."""
+from bisect import bisect_left
+from typing import Callable, Optional
+
+from napps.amlight.coloring.utils import fill_zero_bytes
+
+# Width in bits of the fields that support masked matches
+MASKABLE_FIELDS = {'dl_src': 48, 'dl_dst': 48, 'nw_src': 32, 'nw_dst': 32}
+
+
+def field_value(color: int, field: str) -> int:
+    """Integer value of a color encoded for a maskable field, the same
+    value color_to_field formats."""
+    if MASKABLE_FIELDS[field] == 48:
+        return (fill_zero_bytes(color) & 0xf0ffffffffff) | 0x0e0000000000
+    return color & 0xffffffff
+
+
+def block_color_valid(field: str,
+                      block_bits: int) -> Optional[Callable[[int], bool]]:
+    """Predicate of the colors whose field values stay in the aligned block
+    of 2 ** block_bits values of their color block, None if all do.
+
+    Zero bytes of MAC colors are filled with 0xee, so colors with a 0xee
+    byte, or a zero byte among the ones varying within a block, are
+    rejected."""
+    if MASKABLE_FIELDS[field] != 48:
+        return None
+    low_bytes = max(1, -(-block_bits // 8))
+
+    def valid(color: int) -> bool:
+        data = (color & 0xffffffffffff).to_bytes(6, 'big')
+        return b'\xee' not in data and 0 not in data[-low_bytes:]
+    return valid
+
+
+def masked_match(value: int, prefix_len: int, field: str) -> str:
+    """Format a (value, prefix length) entry as a match of the field."""
+    width = MASKABLE_FIELDS[field]
+    if width == 48:
+        mac = value.to_bytes(6, 'big').hex(':')
+        if prefix_len == width:
+            return mac
+        mask = ((1 << prefix_len) - 1) << (width - prefix_len)
+        return f"{mac}/{mask.to_bytes(6, 'big').hex(':')}"
+    address = '.'.join(map(str, value.to_bytes(4, 'big')))
+    if prefix_len == width:
+        return address
+    return f"{address}/{prefix_len}"
+
+
+def prefix_cover(members: set[int], ordered: list[int], width: int,
+                 min_prefix: int = 0) -> list[tuple[int, int]]:
+    """Cover the members with the fewest (value, prefix length) entries
+    that match no other value of ``ordered``.
+
+    ``ordered`` holds every value in use, sorted and without duplicates,
+    members included. Values not in use can be matched, they don't belong
+    to any switch. Prefixes are never shorter than ``min_prefix``.
+    """
+    positions = sorted(bisect_left(ordered, member) for member in members)
+    entries = []
+
+    def visit(low: int, high: int, prefix: int, depth: int) -> None:
+        inside = bisect_left(positions, high) - bisect_left(positions, low)
+        if not inside:
+            return
+        if inside == high - low and depth >= min_prefix:
+            entries.append((prefix << (width - depth), depth))
+            return
+        upper_half = ((prefix << 1) | 1) << (width - depth - 1)
+        split = bisect_left(ordered, upper_half, low, high)
+        visit(low, split, prefix << 1, depth + 1)
+        visit(split, high, (prefix << 1) | 1, depth + 1)
+
+    visit(0, len(ordered), 0, 0)
+    return entries
@@ -0,0 +1,182 @@
+"""Binary color table for external consumers.
+
+The table is a little-endian header followed by fixed size records sorted
+by dpid, so it can be memory-mapped and binary searched without parsing:
+
+    header: magic b'COLT', version (u16), record size (u16),
+            color field (16 bytes, NUL padded), count (u64),
+            generation (u64)
+    record: dpid (u64), color (u64), field value (u64), degree (u32),
+            reserved (u32)
+
+The table is replaced atomically, so a reader keeps a consistent view of
+the table it mapped.
+"""
+import ipaddress
+import mmap
+import os
+import struct
+import tempfile
+from bisect import bisect_left
+from typing import Iterator, NamedTuple, Optional, Union
+
+MAGIC = b'COLT'
+VERSION = 1
+HEADER = struct.Struct('<4sHH16sQQ')
+RECORD = struct.Struct('<QQQII')
+
+
+class ColorRecord(NamedTuple):
+    """A record of the color table."""
+    dpid: int
+    color: int
+    value: int
+    degree: int
+
+
+def dpid_to_int(dpid: str) -> int:
+    """Integer of a dpid such as '00:00:00:00:00:00:00:01'."""
+    return int(dpid.replace(':', ''), 16)
+
+
+def int_to_dpid(value: int) -> str:
+    """dpid string of an integer."""
+    return value.to_bytes(8, 'big').hex(':')
+
+
+def field_int(value: Union[str, int]) -> int:
+    """Integer of a value encoded by colors_to_field."""
+    if isinstance(value, int):
+        return value
+    if ':' in value:
+        return int(value.replace(':', ''), 16)
+    return int(ipaddress.IPv4Address(value))
+
+
+def format_field(value: int, field: str) -> Union[str, int]:
+    """Format an integer field value as colors_to_field does."""
+    if field in ('dl_src', 'dl_dst'):
+        return value.to_bytes(6, 'big').hex(':')
+    if field in ('nw_src', 'nw_dst'):
+        return str(ipaddress.IPv4Address(value))
+    return value
+
+
+def pack_records(records: list[tuple[int, int, int, int]]) -> bytes:
+    """Pack (dpid, color, value, degree) records, sorted by dpid."""
+    data = bytearray(RECORD.size * len(records))
+    for index, record in enumerate(sorted(records)):
+        RECORD.pack_into(data, index * RECORD.size, *record, 0)
+    return bytes(data)
+
+
+def read_generation(path: str) -> int:
+    """Generation of the table at path, 0 if there's no valid table."""
+    try:
+        with open(path, 'rb') as file:
+            magic, *_, generation = HEADER.unpack(file.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return generation if magic == MAGIC else 0
+
+
+def write_color_table(path: str, field: str, generation: int,
+                      records: bytes, mode: int = 0o644) -> None:
+    """Atomically replace the table at path with the packed records."""
+    header = HEADER.pack(MAGIC, VERSION, RECORD.size, field.encode(),
+                         len(records) // RECORD.size, generation)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.color_table')
+    try:
+        # mkstemp creates the file readable by its owner only
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(header)
+            file.write(records)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ColorTable:
+    """Memory-mapped reader of a color table.
+
+    Records are unpacked from the mapping on access, dpids are looked up
+    with a binary search."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, record_size, field, self.count,
+             self.generation) = HEADER.unpack_from(self._mmap)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a color table")
+            if version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"Unsupported color table version "
+                                 f"{version} with {record_size} bytes "
+                                 f"records")
+            if len(self._mmap) < HEADER.size + self.count * RECORD.size:
+                raise ValueError(f"{path} is truncated")
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise
+        self.field = field.rstrip(b'\0').decode()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> ColorRecord:
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        dpid, color, value, degree, _ = RECORD.unpack_from(
+            self._mmap, HEADER.size + index * RECORD.size
+        )
+        return ColorRecord(dpid, color, value, degree)
+
+    def __iter__(self) -> Iterator[ColorRecord]:
+        for index in range(self.count):
+            yield self[index]
+
+    def find(self, dpid: Union[str, int]) -> Optional[ColorRecord]:
+        """Record of a dpid, or None."""
+        if isinstance(dpid, str):
+            dpid = dpid_to_int(dpid)
+        index = bisect_left(range(self.count), dpid,
+                            key=lambda i: self[i].dpid)
+        if index < self.count and self[index].dpid == dpid:
+            return self[index]
+        return None
+
+    def colors(self) -> dict:
+        """Switch colors in the format of GET colors."""
+        return {int_to_dpid(record.dpid):
+                {'color_field': self.field,
+                 'color_value': format_field(record.value, self.field)}
+                for record in self}
+
+    def close(self) -> None:
+        """Unmap the table."""
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+
+def read_colors(path: str, field: str) -> dict[str, int]:
+    """Color of each dpid in the table at path, empty if there's no valid
+    table or it was written for another color field."""
+    try:
+        with ColorTable(path) as table:
+            if table.field != field:
+                return {}
+            return {int_to_dpid(record.dpid): record.color
+                    for record in table}
+    except (OSError, ValueError, struct.error):
+        return {}
@@ -0,0 +1,64 @@
+"""OpenFlow version encoders.
+
+Each supported OpenFlow version registers an encoder that knows how to turn a
+color into the match and the controller-output actions of a coloring flow.
+"""
+from functools import lru_cache
+from typing import Optional
+
+from pyof.v0x04.common.port import PortNo
+
+ENCODERS = {}
+
+
+def register_encoder(cls):
+    """Register an encoder class for its ``ofp_version``."""
+    ENCODERS[cls.ofp_version] = cls
+    get_encoder.cache_clear()
+    return cls
+
+
+@lru_cache(maxsize=None)
+def get_encoder(ofp_version: str) -> Optional["ColorEncoder"]:
+    """Return the cached encoder for an OpenFlow version.
+
+    None is returned when the version isn't supported.
+    """
+    encoder_cls = ENCODERS.get(ofp_version)
+    if encoder_cls is None:
+        return None
+    return encoder_cls()
+
+
+class ColorEncoder:
+    """Base encoder of coloring flows."""
+
+    ofp_version = None
+    controller_port = None
+
+    def match(self, field: str, value) -> dict:
+        """Build the match of a color flow."""
+        return {field: value}
+
+    def actions(self) -> list:
+        """Build the actions sending matched packets to the controller."""
+        return [{'action_type': 'output', 'port': self.controller_port}]
+
+
+@register_encoder
+class ColorEncoderV0x04(ColorEncoder):
+    """OpenFlow 1.3 encoder."""
+
+    ofp_version = '0x04'
+    controller_port = PortNo.OFPP_CONTROLLER
+
+
+@register_encoder
+class ColorEncoderV0x06(ColorEncoder):
+    """OpenFlow 1.5 encoder.
+
+    OpenFlow 1.5 keeps the 32-bit OFPP_CONTROLLER reserved port of 1.3.
+    """
+
+    ofp_version = '0x06'
+    controller_port = PortNo.OFPP_CONTROLLER
@@ -0,0 +1,121 @@
+"""Installation state of the coloring flows."""
+import time
+from threading import Lock
+from typing import Callable
+
+QUEUED = "queued"
+PENDING = "pending"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+def match_key(match: dict) -> tuple:
+    """Hashable key of a flow match."""
+    return tuple(sorted(match.items()))
+
+
+class FlowTracker:
+    """Track whether flow_manager installed or rejected each sent flow.
+
+    Every sent flow is pending until it's confirmed or failed. Failed and
+    unconfirmed flows become due for a retry after a capped exponential
+    backoff. Flows queued by the rate limiter aren't due until they're
+    sent.
+    """
+
+    def __init__(self, backoff_base: float, backoff_max: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._lock = Lock()
+        # (dpid, match key) -> entry
+        self._flows = {}
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before retrying a flow sent the given number of times."""
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+
+    def queued(self, dpid: str, flows: list[dict]) -> None:
+        """Mark flows as waiting to be sent by the rate limiter."""
+        with self._lock:
+            for flow in flows:
+                key = (dpid, match_key(flow['match']))
+                entry = self._flows.get(key)
+                attempts = 0
+                if entry and entry['state'] != CONFIRMED:
+                    attempts = entry['attempts']
+                self._flows[key] = {
+                    'dpid': dpid,
+                    'flow': flow,
+                    'state': QUEUED,
+                    'attempts': attempts,
+                    'deadline': None,
+                }
+
+    def sent(self, dpid: str, flows: list[dict]) -> None:
+        """Mark flows as sent to flow_manager."""
+        now = self._clock()
+        with self._lock:
+            for flow in flows:
+                key = (dpid, match_key(flow['match']))
+                entry = self._flows.get(key)
+                attempts = 1
+                if entry and entry['state'] != CONFIRMED:
+                    attempts = entry['attempts'] + 1
+                self._flows[key] = {
+                    'dpid': dpid,
+                    'flow': flow,
+                    'state': PENDING,
+                    'attempts': attempts,
+                    'deadline': now + self.backoff(attempts),
+                }
+
+    def _set_state(self, dpid: str, match: dict, state: str) -> bool:
+        """Set the state of a tracked flow."""
+        with self._lock:
+            entry = self._flows.get((dpid, match_key(match)))
+            if entry is None:
+                return False
+            entry['state'] = state
+            return True
+
+    def confirmed(self, dpid: str, match: dict) -> bool:
+        """Mark a flow as installed."""
+        return self._set_state(dpid, match, CONFIRMED)
+
+    def failed(self, dpid: str, match: dict) -> bool:
+        """Mark a flow as rejected."""
+        return self._set_state(dpid, match, FAILED)
+
+    def forget(self, dpid: str, match: dict) -> None:
+        """Stop tracking a flow, e.g. when it's deleted."""
+        with self._lock:
+            self._flows.pop((dpid, match_key(match)), None)
+
+    def due(self) -> dict[str, list[dict]]:
+        """Failed or unconfirmed flows whose backoff has elapsed."""
+        now = self._clock()
+        flows = {}
+        with self._lock:
+            for entry in self._flows.values():
+                if entry['state'] in (CONFIRMED, QUEUED) or \
+                        entry['deadline'] > now:
+                    continue
+                flows.setdefault(entry['dpid'], []).append(entry['flow'])
+        return flows
+
+    def pending(self) -> list[dict]:
+        """List the flows that aren't confirmed yet."""
+        now = self._clock()
+        with self._lock:
+            return [
+                {'dpid': entry['dpid'],
+                 'match': entry['flow']['match'],
+                 'state': entry['state'],
+                 'attempts': entry['attempts'],
+                 'retry_in': (max(entry['deadline'] - now, 0)
+                              if entry['deadline'] is not None else None)}
+                for entry in self._flows.values()
+                if entry['state'] != CONFIRMED
+            ]
@@ -0,0 +1,199 @@
+"""Graph coloring of the topology."""
+import heapq
+from bisect import bisect_right, insort
+from itertools import chain
+from typing import Callable, Optional
+
+
+def distance2_coloring(adjacency: dict[str, set[str]],
+                       previous: Optional[dict[str, int]] = None,
+                       valid: Optional[Callable[[int], bool]] = None
+                       ) -> dict[str, int]:
+    """Color nodes so that nodes up to 2 hops apart have different colors.
+
+    Previous colors are kept whenever they are still valid, so only the
+    nodes in conflict, or without a color, are colored again. They are
+    colored with DSatur on the square of the graph, using the smallest
+    color available, starting from 1. Colors rejected by ``valid`` are
+    never used.
+    """
+    colors = {}
+    if previous:
+        colors = {node: previous[node] for node in adjacency
+                  if node in previous
+                  and (valid is None or valid(previous[node]))}
+    _drop_conflicts(adjacency, colors)
+    _dsatur(adjacency, colors, valid)
+    return colors
+
+
+def _drop_conflicts(adjacency: dict[str, set[str]],
+                    colors: dict[str, int]) -> None:
+    """Uncolor the nodes sharing a color with a node up to 2 hops apart.
+
+    Two nodes are up to 2 hops apart iff they share a closed
+    neighborhood, the first node in dpid order keeps its color."""
+    for node in adjacency:
+        seen = set()
+        for member in sorted(chain((node,), adjacency[node])):
+            color = colors.get(member)
+            if color is None:
+                continue
+            if color in seen:
+                del colors[member]
+            else:
+                seen.add(color)
+
+
+def _dsatur(adjacency: dict[str, set[str]], colors: dict[str, int],
+            valid: Optional[Callable[[int], bool]]) -> None:
+    """Color the uncolored nodes with DSatur on the square of the graph,
+    the most constrained node first."""
+    forbidden = {}
+    for node in adjacency:
+        if node not in colors:
+            forbidden[node] = {
+                colors[other]
+                for member in chain((node,), adjacency[node])
+                for other in chain((member,), adjacency.get(member, ()))
+                if other in colors
+            }
+    heap = [(-len(used), -len(adjacency[node]), node)
+            for node, used in forbidden.items()]
+    heapq.heapify(heap)
+
+    while heap:
+        saturation, _, node = heapq.heappop(heap)
+        if node in colors or -saturation != len(forbidden[node]):
+            continue
+        color = 1
+        while color in forbidden[node] or (valid and not valid(color)):
+            color += 1
+        colors[node] = color
+        for member in chain((node,), adjacency[node]):
+            for other in chain((member,), adjacency.get(member, ())):
+                if (other in colors or other not in forbidden
+                        or color in forbidden[other]):
+                    continue
+                forbidden[other].add(color)
+                heapq.heappush(heap, (-len(forbidden[other]),
+                                      -len(adjacency[other]), other))
+
+
+class _BlockAllocator:
+    """Aligned blocks of colors that never overlap."""
+
+    def __init__(self, valid: Optional[Callable[[int], bool]],
+                 max_bits: int):
+        self.max_bits = max_bits
+        self._valid = valid
+        # Sorted (start, end) of the claimed blocks
+        self._claimed = []
+        # Block size bits -> start of the first block that might be free
+        self._cursors = {}
+
+    def slots(self, start: int, bits: int) -> list[int]:
+        """Usable colors of a block, 0 is never used."""
+        return [color for color in range(max(start, 1), start + (1 << bits))
+                if self._valid is None or self._valid(color)]
+
+    def is_free(self, start: int, bits: int) -> bool:
+        """Whether a block overlaps no claimed block."""
+        index = bisect_right(self._claimed, (start, float('inf')))
+        if index and self._claimed[index - 1][1] > start:
+            return False
+        return (index == len(self._claimed)
+                or self._claimed[index][0] >= start + (1 << bits))
+
+    def claim(self, start: int, bits: int) -> None:
+        """Claim a block."""
+        insort(self._claimed, (start, start + (1 << bits)))
+
+    def allocate(self, need: int) -> list[int]:
+        """Claim the smallest free block with need usable colors, or the
+        largest one allowed, returning its usable colors."""
+        bits = min(self.max_bits, (need - 1).bit_length())
+        while True:
+            start = self._cursors.get(bits, 0)
+            while not self.is_free(start, bits) or \
+                    not self.slots(start, bits):
+                start += 1 << bits
+            self._cursors[bits] = start
+            slots = self.slots(start, bits)
+            if len(slots) >= need or bits == self.max_bits:
+                self.claim(start, bits)
+                return slots
+            bits += 1
+
+
+def _keep_block_colors(group: list[str], previous: dict[str, int],
+                       allocator: _BlockAllocator,
+                       colors: dict[str, int]) -> bool:
+    """Keep the previous colors of a group if they are unique and still in
+    as few free blocks as a new allocation would take, the members without
+    a color take the free colors of those blocks."""
+    known = sorted(previous[node] for node in group if node in previous)
+    if not known or len(set(known)) != len(known):
+        return False
+    bits = max(min(allocator.max_bits, (len(group) - 1).bit_length()),
+               (known[0] ^ known[-1]).bit_length())
+    if bits <= allocator.max_bits:
+        starts = [known[0] >> bits << bits]
+    else:
+        bits = allocator.max_bits
+        starts = sorted({color >> bits << bits for color in known})
+        if len(starts) > -(-len(group) // (1 << bits)) + 1:
+            return False
+    if not all(allocator.is_free(start, bits) for start in starts):
+        return False
+    slots = [color for start in starts
+             for color in allocator.slots(start, bits)]
+    if len(slots) < len(group) or not set(known).issubset(slots):
+        return False
+    for start in starts:
+        allocator.claim(start, bits)
+    used = set(known)
+    free = (color for color in slots if color not in used)
+    for node in group:
+        colors[node] = previous[node] if node in previous else next(free)
+    return True
+
+
+def block_coloring(adjacency: dict[str, set[str]],
+                   previous: Optional[dict[str, int]] = None,
+                   valid: Optional[Callable[[int], bool]] = None,
+                   max_block_bits: int = 8) -> dict[str, int]:
+    """Color nodes so that the neighbors of each hub share aligned blocks.
+
+    Hubs are visited by decreasing degree, and each one takes its
+    neighbors not taken yet as a group. A group is colored from as few
+    aligned blocks of up to 2 ** max_block_bits colors as possible, so the
+    hub matches it with one masked match per block. Colors are unique, so
+    nodes up to 2 hops apart have different colors. A group keeps its
+    previous colors when they still fit in as few blocks. Colors rejected
+    by ``valid`` are never used.
+    """
+    previous = {node: color for node, color in (previous or {}).items()
+                if node in adjacency
+                and (valid is None or valid(color))}
+    groups = []
+    taken = set()
+    for hub in sorted(adjacency, key=lambda node: (-len(adjacency[node]),
+                                                   node)):
+        group = sorted(node for node in adjacency[hub]
+                       if node not in taken and node in adjacency)
+        taken.update(group)
+        if group:
+            groups.append(group)
+    groups.extend([node] for node in sorted(adjacency) if node not in taken)
+
+    allocator = _BlockAllocator(valid, max_block_bits)
+    colors = {}
+    fresh = [group for group in groups
+             if not _keep_block_colors(group, previous, allocator, colors)]
+    for group in fresh:
+        while group:
+            slots = allocator.allocate(len(group))
+            colors.update(zip(group, slots))
+            group = group[len(slots):]
+    return colors
@@ -6,20 +6,48 @@ NApp to color a network topology
 # with isort.
 # pylint: disable=wrong-import-order
 # isort:skip_file
+import json
 import struct
+import time
+from bisect import bisect_right
 from threading import Lock
 from collections import defaultdict
+from itertools import chain
+from typing import Optional
+
+from starlette.responses import Response, StreamingResponse
 
 from kytos.core import KytosNApp, log, rest
 from kytos.core.common import EntityStatus
 from kytos.core.helpers import listen_to, alisten_to
-from kytos.core.rest_api import JSONResponse, Request
+from kytos.core.rest_api import (HTTPException, JSONResponse, Request,
+                                 get_json_or_400)
 from kytos.core.events import KytosEvent
 from napps.amlight.coloring import settings
-from napps.amlight.coloring.utils import make_unicast_local_mac
-from pyof.v0x04.common.port import PortNo
-
-
+from napps.amlight.coloring.aggregation import (MASKABLE_FIELDS,
+                                                block_color_valid,
+                                                field_value, masked_match,
+                                                prefix_cover)
+from napps.amlight.coloring.color_table import (dpid_to_int, pack_records,
+                                                read_colors,
+                                                read_generation,
+                                                write_color_table)
+from napps.amlight.coloring.encoders import get_encoder
+from napps.amlight.coloring.flow_tracker import FlowTracker, match_key
+from napps.amlight.coloring.graph_coloring import (block_coloring,
+                                                   distance2_coloring)
+from napps.amlight.coloring.profiling import HandlerProfiler
+from napps.amlight.coloring.rate_limiter import FlowModRateLimiter
+from napps.amlight.coloring.replay import (HANDSHAKE_COMPLETED,
+                                           SWITCH_ENABLED, EventRecorder)
+from napps.amlight.coloring.utils import (colors_to_field,
+                                          field_color_valid, field_max_color,
+                                          fill_zero_bytes,
+                                          link_dict_pairs,
+                                          link_pairs, unicast_local_mac)
+
+
+# pylint: disable=too-many-public-methods
 class Main(KytosNApp):
     """Main class of amlight/coloring NApp.
 
@@ -35,97 +63,531 @@ class Main(KytosNApp):
         So, if you have any setup routine, insert it here.
         """
         self.switches = {}
+        # dpid -> encoder of the switches that are enabled, UP and on a
+        # supported OpenFlow version
+        self._eligible = {}
         self._switches_lock = Lock()
         self._flow_manager_url = settings.FLOW_MANAGER_URL
         self._color_field = settings.COLOR_FIELD
+        self._coloring_mode = settings.COLORING_MODE
+        self._masked_matches = settings.MASKED_MATCHES
+        if self._masked_matches and (
+            self._coloring_mode != 'distance2'
+            or self._color_field not in MASKABLE_FIELDS
+        ):
+            log.warning("MASKED_MATCHES requires COLORING_MODE 'distance2' "
+                        "and a dl_src, dl_dst, nw_src or nw_dst "
+                        "COLOR_FIELD, exact matches are used")
+            self._masked_matches = False
+        # dpid -> installs held until the deletion of the masked flows of
+        # the switch is reported
+        self._held_flows = {}
+        self._color_table_path = settings.COLOR_TABLE_PATH
+        self._color_table_lock = Lock()
+        # (generation, packed records) of the last color table written,
+        # the generation goes on from the table of a previous run
+        self._color_table = (0, None)
+        # dpid -> distance2 color of the previous run, which the switches
+        # start from when they're colored for the first time
+        self._seed_colors = {}
+        if self._color_table_path:
+            self._color_table = (read_generation(self._color_table_path),
+                                 None)
+            if self._coloring_mode == 'distance2':
+                self._seed_colors = read_colors(self._color_table_path,
+                                                self._color_field)
         self.table_group = {"base": 0}
+        self._flow_tracker = FlowTracker(settings.FLOW_RETRY_BACKOFF_BASE,
+                                         settings.FLOW_RETRY_BACKOFF_MAX)
+        self._next_retry = 0.0
+        self._rate_limiter = FlowModRateLimiter()
+        self._profiler = HandlerProfiler(self, settings.PROFILED_HANDLERS)
+        self._recorder = None
+        if settings.EVENT_RECORD_PATH:
+            self._recorder = EventRecorder(settings.EVENT_RECORD_PATH)
+        self.execute_as_loop(settings.FLOW_MOD_DISPATCH_INTERVAL)
+        self.bootstrap()
 
     def execute(self):
-        """ Topology updates are executed through events. """
+        """ Topology updates are executed through events, this loop only
+        releases rate limited flow mods and retries the failed or
+        unconfirmed flows. """
+        self._profiler.check()
+        self._release_held_flows()
+        self._dispatch_flow_mods()
+        now = time.monotonic()
+        if now >= self._next_retry:
+            self._next_retry = now + settings.FLOW_RETRY_INTERVAL
+            self.retry_flow_mods()
+
+    def bootstrap(self) -> None:
+        """Color the switches and links already known to the controller,
+        so that a reloaded NApp installs its flows right away instead of
+        waiting for the next kytos/topology.updated."""
+        links = getattr(self.controller, 'links', None)
+        if links is None:
+            topology = self.controller.napps.get(('kytos', 'topology'))
+            links = getattr(topology, 'links', None) or {}
+        links = list(links.values())
+        switches = list(self.controller.switches.values())
+        if not switches:
+            return
+        if self._recorder:
+            self._recorder.topology_updated(switches, links)
+        self.update_colors_from_pairs(link_pairs(links))
 
     @listen_to('kytos/topology.switch.disabled')
     def on_switch_disabled(self, event):
         """Remove switch from self.switches"""
+        if self._recorder:
+            self._recorder.switch_disabled(event.content['dpid'])
         self.handle_switch_disabled(event.content['dpid'])
 
+    @listen_to('kytos/topology.switch.enabled')
+    def on_switch_enabled(self, event):
+        """Update the eligibility of an enabled switch."""
+        switch = self.controller.get_switch_by_dpid(event.content['dpid'])
+        if switch:
+            if self._recorder:
+                self._recorder.switch_status(SWITCH_ENABLED, switch)
+            self.handle_switch_status(switch)
+
+    @listen_to('kytos/of_core.handshake.completed')
+    def on_handshake_completed(self, event):
+        """Update the eligibility of a connected switch and resync its
+        flows, which are gone if the switch rebooted."""
+        switch = event.content['switch']
+        if self._recorder:
+            self._recorder.switch_status(HANDSHAKE_COMPLETED, switch)
+        self.handle_switch_status(switch)
+        self.handle_switch_resync(switch.dpid)
+
+    @listen_to('.*.connection.lost')
+    def on_connection_lost(self, event):
+        """Stop installing flows on a disconnected switch."""
+        switch = getattr(event.content['source'], 'switch', None)
+        if switch:
+            if self._recorder:
+                self._recorder.connection_lost(switch.dpid)
+            self.handle_switch_down(switch.dpid)
+
     @listen_to('kytos/topology.link.disabled')
     def on_link_disabled(self, event):
         """Remove link from self.switches neighbors"""
+        if self._recorder:
+            self._recorder.link_disabled(event.content['link'])
         self.handle_link_disabled(event.content['link'])
 
+    @listen_to('kytos/flow_manager.flow.added',
+               'kytos/flow_manager.flow.error',
+               'kytos/flow_manager.flow.removed')
+    def on_flow_result(self, event):
+        """Track the flows installed, rejected or deleted by
+        flow_manager."""
+        if event.name == 'kytos/flow_manager.flow.removed':
+            self._handle_flow_removed(event.content['datapath'].dpid,
+                                      event.content['flow'])
+            return
+        self.handle_flow_result(
+            event.content['datapath'].dpid,
+            event.content['flow'],
+            failed=event.name == 'kytos/flow_manager.flow.error'
+        )
+
     @listen_to('kytos/topology.updated')
     def topology_updated(self, event):
         """Update colors on topology update."""
-        topology = event.content['topology']
-        self.update_colors(
-            [link.as_dict() for link in topology.links.values()]
+        if self._recorder:
+            self._recorder.topology_updated(
+                list(self.controller.switches.values()),
+                list(event.content['topology'].links.values())
+            )
+        self.handle_topology_updated(event.content['topology'])
+
+    def handle_topology_updated(self, topology):
+        """Update colors from the topology links, without serializing
+        them."""
+        self.update_colors_from_pairs(
+            link_pairs(list(topology.links.values()))
         )
 
-    # pylint: disable=too-many-branches
     def update_colors(self, links):
+        """ Update colors from link dicts, as returned by link.as_dict()."""
+        self.update_colors_from_pairs(link_dict_pairs(links))
+
+    # pylint: disable=too-many-branches
+    def update_colors_from_pairs(self, links):
         """ Color each switch, with the color based on the switch's DPID.
             After that, if not yet installed, installs, for each switch, flows
             with the color of its neighbors, to send probe packets to the
             controller.
+
+            links is an iterable of (dpid_a, dpid_b) pairs of enabled links.
         """
         with self._switches_lock:
-            for switch in self.controller.switches.copy().values():
+            old_adjacency = None
+            if self._coloring_mode == 'distance2':
+                old_adjacency = {
+                    dpid: switch_dict['neighbors']
+                    for dpid, switch_dict in self.switches.items()
+                }
+            new_dpids = []
+            for switch in list(self.controller.switches.values()):
                 if not switch.is_enabled():
+                    self._eligible.pop(switch.dpid, None)
                     if switch.dpid in self.switches:
                         self.switches[switch.dpid]['neighbors'] = set()
                     continue
                 if switch.dpid not in self.switches:
+                    # Known switches have their eligibility updated by
+                    # status events
+                    self._update_eligibility(switch)
                     color = int(switch.dpid.replace(':', '')[4:], 16)
                     self.switches[switch.dpid] = {'color': color,
                                                   'neighbors': set(),
                                                   'flows': {}}
+                    new_dpids.append(switch.dpid)
                 else:
                     self.switches[switch.dpid]['neighbors'] = set()
 
-            for link in links:
-                if link.get('enabled') is not True:
-                    continue
-                source = link['endpoint_a']['switch']
-                target = link['endpoint_b']['switch']
+            for source, target in links:
                 if source != target:
                     self.switches[source]['neighbors'].add(target)
                     self.switches[target]['neighbors'].add(source)
 
+            deleted_flows = defaultdict(list)
+            if old_adjacency is not None:
+                deleted_flows = self._recolor_distance2(old_adjacency,
+                                                        new_dpids)
+
         dpid_flows = defaultdict(list)
 
         # Create the flows for each neighbor of each switch and installs it
         # if not already installed
         with self._switches_lock:
-            for dpid, switch_dict in self.switches.items():
-                switch = self.controller.get_switch_by_dpid(dpid)
-                if switch.status != EntityStatus.UP:
+            values, ordered = self._masked_values()
+            exact = []
+            for dpid, encoder in self._eligible.items():
+                if dpid not in self.switches:
                     continue
-                if switch.ofp_version == '0x04':
-                    controller_port = PortNo.OFPP_CONTROLLER
-                else:
+                if values is not None and self._aggregate_flows(
+                    dpid, encoder, values, ordered, dpid_flows, deleted_flows
+                ):
                     continue
-                for neighbor in switch_dict['neighbors']:
-                    if neighbor not in switch_dict['flows']:
-                        flow_dict = {
-                            'match': {},
-                            'priority': 50000,
-                            'actions': [
-                                {'action_type': 'output',
-                                 'port': controller_port}
-                            ],
-                            'cookie': self.get_cookie(dpid)}
-
-                        flow_dict['match'][self._color_field] = \
-                            self.color_to_field(
-                                self.switches[neighbor]['color'],
-                                self._color_field
-                            )
-                        self.set_flow_table_group_owner(flow_dict)
-
-                        switch_dict['flows'][neighbor] = flow_dict
-                        dpid_flows[dpid].append(flow_dict)
+                exact.append((dpid, encoder))
+            self._build_neighbor_flows(exact, dpid_flows)
 
+            self._delete_stale_flows(deleted_flows)
+            self._hold_flows(dpid_flows)
+
+        if deleted_flows:
+            self._send_flow_mods(deleted_flows, "delete")
         self._send_flow_mods(dpid_flows, "install")
+        self._publish_color_table()
+
+    def _build_neighbor_flows(self, switches: list[tuple],
+                              installs: dict) -> None:
+        """Build the flows of the neighbors of the (dpid, encoder) switches
+        that aren't installed yet, adding them to installs. The neighbor
+        colors are encoded in one batch.
+        self._switches_lock is expected to be held."""
+        missing = [(dpid, encoder, neighbor)
+                   for dpid, encoder in switches
+                   for neighbor in self.switches[dpid]['neighbors']
+                   if neighbor not in self.switches[dpid]['flows']]
+        values = colors_to_field(
+            [self.switches[neighbor]['color'] for _, _, neighbor in missing],
+            self._color_field
+        )
+        for (dpid, encoder, neighbor), value in zip(missing, values):
+            flow_dict = self._build_match_flow(dpid, value, encoder)
+            self.switches[dpid]['flows'][neighbor] = flow_dict
+            installs[dpid].append(flow_dict)
+
+    def _masked_values(self) -> tuple[Optional[dict], Optional[list]]:
+        """Color field value of each switch, and all of them sorted, to
+        cover neighbors with masked matches. (None, None) when masked
+        matches are off.
+        self._switches_lock is expected to be held."""
+        if not self._masked_matches:
+            return None, None
+        values = {dpid: field_value(switch_dict['color'], self._color_field)
+                  for dpid, switch_dict in self.switches.items()}
+        return values, sorted(set(values.values()))
+
+    def _delete_stale_flows(self, deletes: dict) -> None:
+        """Add the FlowMods deleting up to STALE_FLOWS_MAX_PER_UPDATE
+        flows whose neighbor is gone to deletes.
+        self._switches_lock is expected to be held."""
+        stale_flows, stale_left = self._pop_stale_flows(
+            settings.STALE_FLOWS_MAX_PER_UPDATE
+        )
+        if not stale_flows:
+            return
+        reclaimed = sum(len(flows) for flows in stale_flows.values())
+        log.info(f"Deleting {reclaimed} stale coloring flows, "
+                 f"{stale_left} left for the next updates")
+        for dpid, flows in stale_flows.items():
+            deletes[dpid].extend(flows)
+
+    def _recolor_distance2(self, old_adjacency: dict,
+                           new_dpids: list) -> dict:
+        """Recolor the switches so that colors are unique within 2 hops.
+
+        Colors are only recomputed when the topology changed, and kept
+        whenever possible. The flows matching the previous color of a
+        recolored switch are popped from its neighbors, and their deleting
+        FlowMods returned, so they get installed again with the new color.
+        self._switches_lock is expected to be held."""
+        flow_mods = defaultdict(list)
+        if not new_dpids and all(
+            old_adjacency.get(dpid) == switch_dict['neighbors']
+            for dpid, switch_dict in self.switches.items()
+        ):
+            return flow_mods
+
+        adjacency = {dpid: switch_dict['neighbors']
+                     for dpid, switch_dict in self.switches.items()}
+        previous = {dpid: switch_dict['color']
+                    for dpid, switch_dict in self.switches.items()
+                    if dpid in old_adjacency}
+        seeded = {dpid: self._seed_colors.pop(dpid) for dpid in new_dpids
+                  if dpid in self._seed_colors}
+        previous.update(seeded)
+        if self._masked_matches:
+            # Neighbors of a switch share aligned blocks of colors, which
+            # masked matches cover
+            bits = settings.MASKED_MATCHES_MAX_WILDCARD_BITS
+            colors = block_coloring(
+                adjacency, previous,
+                block_color_valid(self._color_field, bits), bits
+            )
+        else:
+            colors = distance2_coloring(
+                adjacency, previous, field_color_valid(self._color_field)
+            )
+        for dpid, color in colors.items():
+            switch_dict = self.switches[dpid]
+            if switch_dict['color'] == color:
+                continue
+            switch_dict['color'] = color
+            for neighbor in switch_dict['neighbors']:
+                flow = self.switches[neighbor]['flows'].pop(dpid, None)
+                if flow is not None:
+                    flow_mods[neighbor].append(self._flow_deletion(flow))
+        self._delete_seeded_flows(seeded, flow_mods)
+
+        max_color = field_max_color(self._color_field)
+        if colors and max(colors.values()) > max_color:
+            log.warning(f"The topology needs {max(colors.values())} colors, "
+                        f"more than the {max_color} that fit the color "
+                        f"field {self._color_field}")
+        return flow_mods
+
+    def _delete_seeded_flows(self, seeded: dict, flow_mods: dict) -> None:
+        """Delete the flows that the previous run installed on the
+        neighbors of the switches whose seeded color changed.
+
+        The neighbors of the previous run aren't known, the current ones
+        are used. A color now used by another neighbor keeps its flow.
+        self._switches_lock is expected to be held."""
+        for dpid, color in seeded.items():
+            if self.switches[dpid]['color'] == color:
+                continue
+            for neighbor in self.switches[dpid]['neighbors']:
+                encoder = self._eligible.get(neighbor)
+                neighbor_dict = self.switches[neighbor]
+                if encoder is None or any(
+                    self.switches[other]['color'] == color
+                    for other in neighbor_dict['neighbors']
+                ):
+                    continue
+                flow = self._build_flow(neighbor, color, encoder)
+                flow_mods[neighbor].append(self._flow_deletion(flow))
+
+    def _update_eligibility(self, switch) -> None:
+        """Track whether flows can be installed on a switch.
+        self._switches_lock is expected to be held."""
+        encoder = get_encoder(switch.ofp_version)
+        if (encoder is not None and switch.status == EntityStatus.UP
+                and switch.is_enabled()):
+            self._eligible[switch.dpid] = encoder
+        else:
+            self._eligible.pop(switch.dpid, None)
+
+    def handle_switch_status(self, switch) -> None:
+        """Handle a switch status change."""
+        with self._switches_lock:
+            self._update_eligibility(switch)
+
+    def handle_switch_down(self, dpid: str) -> None:
+        """Handle a switch that is no longer reachable."""
+        with self._switches_lock:
+            self._eligible.pop(dpid, None)
+
+    def handle_switch_resync(self, dpid: str) -> None:
+        """Reinstall the flows of a single switch from the cached colors.
+
+        Only the switch neighbors are visited, so it costs O(degree)
+        instead of a whole topology update."""
+        with self._switches_lock:
+            encoder = self._eligible.get(dpid)
+            switch_dict = self.switches.get(dpid)
+            if encoder is None or switch_dict is None:
+                return
+            flows = list((switch_dict.get('masked_flows') or {}).values())
+            for neighbor in switch_dict['neighbors']:
+                if flows and neighbor not in switch_dict['flows']:
+                    # Covered by the masked flows
+                    continue
+                neighbor_dict = self.switches.get(neighbor)
+                if neighbor_dict is None:
+                    continue
+                flow_dict = self._build_flow(
+                    dpid, neighbor_dict['color'], encoder
+                )
+                switch_dict['flows'][neighbor] = flow_dict
+                flows.append(flow_dict)
+            installs = {dpid: flows}
+            self._hold_flows(installs)
+        if installs.get(dpid):
+            self._send_flow_mods(installs, "install")
+
+    # pylint: disable=too-many-arguments
+    def _aggregate_flows(self, dpid: str, encoder, values: dict,
+                         ordered: list, installs: dict,
+                         deletes: dict) -> bool:
+        """Cover the neighbor colors of a switch with masked matches.
+
+        values maps each dpid to its color field value, and ordered holds
+        all of them sorted. The masked flows are kept in 'masked_flows' and
+        replace the exact flows. False is returned when masks don't save
+        entries, the exact flows are used then.
+        self._switches_lock is expected to be held."""
+        switch_dict = self.switches[dpid]
+        neighbors = switch_dict['neighbors']
+        masked_flows = switch_dict.setdefault('masked_flows', {})
+        width = MASKABLE_FIELDS[self._color_field]
+        cover = prefix_cover(
+            {values[neighbor] for neighbor in neighbors}, ordered, width,
+            width - settings.MASKED_MATCHES_MAX_WILDCARD_BITS
+        )
+        if len(cover) >= len(neighbors):
+            for flow in masked_flows.values():
+                self._delete_masked_flow(dpid, flow, deletes)
+            masked_flows.clear()
+            return False
+
+        matches = {masked_match(value, prefix_len, self._color_field)
+                   for value, prefix_len in cover}
+        for match in list(masked_flows):
+            if match not in matches:
+                self._delete_masked_flow(dpid, masked_flows.pop(match),
+                                         deletes)
+        for match in matches:
+            if match not in masked_flows:
+                flow = self._build_match_flow(dpid, match, encoder)
+                masked_flows[match] = flow
+                installs[dpid].append(flow)
+        for flow in switch_dict['flows'].values():
+            deletes[dpid].append(self._flow_deletion(flow))
+        switch_dict['flows'].clear()
+        return True
+
+    def _delete_masked_flow(self, dpid: str, flow: dict,
+                            deletes: dict) -> None:
+        """Delete a masked flow, holding the next installs of the switch
+        until flow_manager reports the deletion.
+        self._switches_lock is expected to be held."""
+        deletes[dpid].append(self._flow_deletion(flow))
+        held = self._held_flows.setdefault(
+            dpid, {'deletes': set(), 'flows': [], 'deadline': 0.0}
+        )
+        held['deletes'].add(match_key(flow['match']))
+        held['deadline'] = (time.monotonic()
+                            + settings.MASKED_MATCHES_DELETE_TIMEOUT)
+
+    def _hold_flows(self, installs: dict) -> None:
+        """Hold the installs of the switches whose masked flows are being
+        deleted. Deletes aren't strict, a masked one also deletes the flows
+        it covers, so it must reach the switch before them.
+        self._switches_lock is expected to be held."""
+        for dpid, held in self._held_flows.items():
+            if dpid in installs:
+                held['flows'].extend(installs.pop(dpid))
+
+    def _pop_held_flows(self, dpid: str) -> list[dict]:
+        """Pop the held installs of a switch that are still current.
+        self._switches_lock is expected to be held."""
+        held = self._held_flows.pop(dpid)
+        switch_dict = self.switches.get(dpid)
+        if switch_dict is None:
+            return []
+        current = {id(flow) for flow in chain(
+            switch_dict['flows'].values(),
+            (switch_dict.get('masked_flows') or {}).values()
+        )}
+        return [flow for flow in held['flows'] if id(flow) in current]
+
+    def _handle_flow_removed(self, dpid: str, flow) -> None:
+        """Send the held installs of a switch once all of its masked
+        flows being deleted are reported removed."""
+        if flow.cookie >> 56 != settings.COOKIE_PREFIX:
+            return
+        key = match_key(flow.as_dict()['match'])
+        with self._switches_lock:
+            held = self._held_flows.get(dpid)
+            if held is None or key not in held['deletes']:
+                return
+            held['deletes'].discard(key)
+            if held['deletes']:
+                return
+            flows = self._pop_held_flows(dpid)
+        if flows:
+            self._send_flow_mods({dpid: flows}, "install")
+
+    def _release_held_flows(self) -> None:
+        """Send the held installs whose masked flow deletions weren't
+        reported in time."""
+        now = time.monotonic()
+        with self._switches_lock:
+            expired = [dpid for dpid, held in self._held_flows.items()
+                       if held['deadline'] <= now]
+            flows = {dpid: self._pop_held_flows(dpid) for dpid in expired}
+        flows = {dpid: mod_flows for dpid, mod_flows in flows.items()
+                 if mod_flows}
+        if flows:
+            log.warning(f"Deletion of masked flows not reported on "
+                        f"{len(flows)} switches, installing their flows")
+            self._send_flow_mods(flows, "install")
+
+    def _aggregation_report(self) -> dict:
+        """Flow entries saved by masked matches on each switch."""
+        with self._switches_lock:
+            report = {}
+            for dpid, switch_dict in self.switches.items():
+                entries = (len(switch_dict.get('masked_flows') or ())
+                           or len(switch_dict['flows']))
+                neighbors = len(switch_dict['neighbors'])
+                report[dpid] = {'neighbors': neighbors,
+                                'entries': entries,
+                                'saved': max(neighbors - entries, 0)}
+            return report
+
+    def _build_flow(self, dpid: str, color: int, encoder) -> dict:
+        """Build the flow matching a neighbor color on the given switch."""
+        return self._build_match_flow(
+            dpid, self.color_to_field(color, self._color_field), encoder
+        )
+
+    def _build_match_flow(self, dpid: str, value, encoder) -> dict:
+        """Build the flow matching a color field value on the switch."""
+        flow_dict = {
+            'match': encoder.match(self._color_field, value),
+            'priority': 50000,
+            'actions': encoder.actions(),
+            'cookie': self.get_cookie(dpid)}
+        return self.set_flow_table_group_owner(flow_dict)
 
     def handle_link_disabled(self, link):
         """Handle link disabling. Deletes only flows from the proper switches.
@@ -138,27 +600,56 @@ class Main(KytosNApp):
 
         with self._switches_lock:
             flow_mods = defaultdict(list)
-            flow = self.switches[switch_a_id]['flows'][switch_b_id]
-            flow_mods[switch_a_id].append({
-                "table_id": flow['table_id'],
-                "owner": 'coloring',
-                "match": flow['match']
-            })
-            flow = self.switches[switch_b_id]['flows'][switch_a_id]
-            flow_mods[switch_b_id].append({
-                "table_id": flow['table_id'],
-                "owner": 'coloring',
-                "match": flow['match']
-            })
-            self.switches[switch_a_id]['flows'].pop(switch_b_id)
-            self.switches[switch_b_id]['flows'].pop(switch_a_id)
-        self._send_flow_mods(flow_mods, "delete")
+            for dpid, neighbor in ((switch_a_id, switch_b_id),
+                                   (switch_b_id, switch_a_id)):
+                # The flow might have been collected already by update_colors
+                flow = self.switches[dpid]['flows'].pop(neighbor, None)
+                if flow is not None:
+                    flow_mods[dpid].append(self._flow_deletion(flow))
+        if flow_mods:
+            self._send_flow_mods(flow_mods, "delete")
+
+    @staticmethod
+    def _flow_deletion(flow: dict) -> dict:
+        """Build the FlowMod deleting a coloring flow."""
+        return {
+            "table_id": flow['table_id'],
+            "owner": 'coloring',
+            "match": flow['match']
+        }
+
+    def _pop_stale_flows(self, limit: int) -> tuple[dict, int]:
+        """Pop up to limit flows whose neighbor is gone, returning their
+        FlowMods and how many stale flows are left.
+        self._switches_lock is expected to be held."""
+        flow_mods = defaultdict(list)
+        popped = left = 0
+        for dpid, switch_dict in self.switches.items():
+            masked_flows = switch_dict.get('masked_flows')
+            if masked_flows and not switch_dict['neighbors']:
+                for flow in masked_flows.values():
+                    self._delete_masked_flow(dpid, flow, flow_mods)
+                popped += len(masked_flows)
+                masked_flows.clear()
+            flows = switch_dict['flows']
+            stale = [neighbor for neighbor in flows
+                     if neighbor not in switch_dict['neighbors']]
+            for neighbor in stale:
+                if popped >= limit:
+                    left += 1
+                    continue
+                flow_mods[dpid].append(
+                    self._flow_deletion(flows.pop(neighbor))
+                )
+                popped += 1
+        return flow_mods, left
 
     def handle_switch_disabled(self, dpid):
         """Handle switch deletion. Links are expected to be disabled first
          therefore the deleted inner dictionary is expected to be empty with
          no flows and neighbors."""
         with self._switches_lock:
+            self._eligible.pop(dpid, None)
             try:
                 sw_dct = self.switches[dpid]
                 if sw_dct['flows'] or sw_dct['neighbors']:
@@ -171,12 +662,15 @@ class Main(KytosNApp):
                           f"Switch {err} not found.")
                 return
             self.switches.pop(dpid, None)
+        self._publish_color_table()
 
     def shutdown(self):
         """This method is executed when your napp is unloaded.
 
         If you have some cleanup procedure, insert it here.
         """
+        if self._recorder:
+            self._recorder.close()
 
     @staticmethod
     def color_to_field(color, field='dl_src'):
@@ -188,10 +682,7 @@ class Main(KytosNApp):
         :return: A representation of the color suitable for the given field
         """
         if field in ('dl_src', 'dl_dst'):
-            color_64bits = color & 0xffffffffffffffff
-            int_mac_6bytes = struct.pack('!Q', color_64bits)[2:]
-            color_value = ':'.join([f'{b:02x}' for b in int_mac_6bytes])
-            return make_unicast_local_mac(color_value.replace('00', 'ee'))
+            return unicast_local_mac(fill_zero_bytes(color))
         if field in ('nw_src', 'nw_dst'):
             color_32bits = color & 0xffffffff
             int_ip = struct.pack('!L', color_32bits)
@@ -202,22 +693,135 @@ class Main(KytosNApp):
             return color & 0xff
         return color & 0xff
 
+    def _colors_snapshot(self, dpids: Optional[list[str]] = None
+                         ) -> list[tuple[str, int]]:
+        """Copy the (dpid, color) pairs of all or the given switches."""
+        with self._switches_lock:
+            if dpids is None:
+                return [(dpid, switch_dict['color'])
+                        for dpid, switch_dict in self.switches.items()]
+            return [(dpid, self.switches[dpid]['color'])
+                    for dpid in dpids if dpid in self.switches]
+
+    def _encode_snapshot(self, snapshot: list[tuple[str, int]]) -> dict:
+        """Build switch colors dict from (dpid, color) pairs."""
+        values = colors_to_field([color for _, color in snapshot],
+                                 self._color_field)
+        return {dpid: {'color_field': self._color_field,
+                       'color_value': value}
+                for (dpid, _), value in zip(snapshot, values)}
+
     def _switch_colors(self) -> dict:
         """Build switch colors dict."""
-        with self._switches_lock:
-            colors = {}
-            for dpid, switch_dict in self.switches.items():
-                colors[dpid] = {'color_field': self._color_field,
-                                'color_value': self.color_to_field(
-                                    switch_dict['color'],
-                                    field=self._color_field
-                                )}
-            return colors
+        return self._encode_snapshot(self._colors_snapshot())
+
+    def _publish_color_table(self) -> None:
+        """Write the binary color table to COLOR_TABLE_PATH, if it changed
+        since it was last written."""
+        if not self._color_table_path:
+            return
+        # The snapshot is taken under the color table lock, so that the
+        # tables are written in the order of their snapshots
+        with self._color_table_lock:
+            with self._switches_lock:
+                snapshot = [(dpid, switch_dict['color'],
+                             len(switch_dict['neighbors']))
+                            for dpid, switch_dict in self.switches.items()]
+            field = self._color_field
+            if field in MASKABLE_FIELDS:
+                values = [field_value(color, field)
+                          for _, color, _ in snapshot]
+            else:
+                values = colors_to_field([color for _, color, _ in snapshot],
+                                         field)
+            records = pack_records([
+                (dpid_to_int(dpid), color, value, degree)
+                for (dpid, color, degree), value in zip(snapshot, values)
+            ])
+            generation, last_records = self._color_table
+            if records == last_records:
+                return
+            generation += 1
+            try:
+                write_color_table(self._color_table_path, self._color_field,
+                                  generation, records)
+            except OSError as err:
+                log.error(f"Error while writing the color table to "
+                          f"{self._color_table_path}: {err}")
+                return
+            self._color_table = (generation, records)
+
+    def _ndjson_colors(self, snapshot: list[tuple[str, int]]):
+        """Generate switch colors as NDJSON, encoding a chunk at a time."""
+        size = settings.COLORS_CHUNK_SIZE
+        for start in range(0, len(snapshot), size):
+            colors = self._encode_snapshot(snapshot[start:start + size])
+            yield ''.join(
+                json.dumps({'dpid': dpid, **color}) + '\n'
+                for dpid, color in colors.items()
+            )
+
+    def handle_flow_result(self, dpid: str, flow, failed: bool) -> None:
+        """Set the state of a coloring flow from a flow_manager result."""
+        if flow.cookie >> 56 != settings.COOKIE_PREFIX:
+            return
+        match = flow.as_dict()['match']
+        if failed:
+            log.warning(f"Coloring flow {match} failed on switch {dpid}")
+            self._flow_tracker.failed(dpid, match)
+        else:
+            self._flow_tracker.confirmed(dpid, match)
+
+    def retry_flow_mods(self) -> None:
+        """Resend the failed or unconfirmed flows whose backoff elapsed."""
+        flows = self._flow_tracker.due()
+        if flows:
+            self._send_flow_mods(flows, "install")
+
+    def _flow_mod_rate(self, dpid: str):
+        """Get the (rate, burst) flow mod limit of a switch, None if it
+        isn't rate limited."""
+        rate = settings.FLOW_MOD_RATE_BY_DPID.get(dpid)
+        if rate is None:
+            encoder = self._eligible.get(dpid)
+            if encoder is not None:
+                rate = settings.FLOW_MOD_RATE_BY_OFP_VERSION.get(
+                    encoder.ofp_version
+                )
+        if rate is None:
+            rate = settings.FLOW_MOD_RATE_DEFAULT
+        return rate
 
     def _send_flow_mods(
         self, flows: dict, action: str, force: bool = True
     ) -> None:
-        """Remove FlowMods"""
+        """Send FlowMods, queueing them on rate limited switches."""
+        unlimited = {}
+        for dpid, mod_flows in flows.items():
+            if action == "delete":
+                # Not retried from now on, even while the delete waits in
+                # the queue
+                for flow in mod_flows:
+                    self._flow_tracker.forget(dpid, flow['match'])
+            limit = self._flow_mod_rate(dpid)
+            if limit is None:
+                unlimited[dpid] = mod_flows
+            else:
+                if action == "install":
+                    # Not retried while they wait in the queue
+                    self._flow_tracker.queued(dpid, mod_flows)
+                self._rate_limiter.submit(dpid, action, force, mod_flows,
+                                          limit)
+        self._put_flow_mods(unlimited, action, force)
+        self._dispatch_flow_mods()
+
+    def _dispatch_flow_mods(self) -> None:
+        """Send the queued FlowMods allowed by the rate limiter."""
+        for dpid, action, force, flows in self._rate_limiter.dispatch():
+            self._put_flow_mods({dpid: flows}, action, force)
+
+    def _put_flow_mods(self, flows: dict, action: str, force: bool) -> None:
+        """Put FlowMods events for flow_manager."""
         for dpid, mod_flows in flows.items():
             name = f"kytos.flow_manager.flows.single.{action}"
             content = {
@@ -225,13 +829,132 @@ class Main(KytosNApp):
                 'flow_dict': {'flows': mod_flows},
                 'force': force,
             }
+            # Tracked before the put, so that a result handled right after
+            # it finds the flow
+            if action == "install":
+                self._flow_tracker.sent(dpid, mod_flows)
             event = KytosEvent(name=name, content=content)
             self.controller.buffers.app.put(event)
 
     @rest('colors')
-    def rest_colors(self, _request: Request) -> JSONResponse:
-        """ List of switch colors."""
-        return JSONResponse({'colors': self._switch_colors()})
+    def rest_colors(self, request: Request) -> JSONResponse:
+        """ List of switch colors.
+
+        Query parameters:
+            dpids: comma separated dpids to filter
+            cursor, limit: paginate in dpid order, starting after cursor
+            format: 'ndjson' streams one switch color per line
+        """
+        params = request.query_params
+        dpids = params.get('dpids')
+        snapshot = self._colors_snapshot(dpids.split(',') if dpids else None)
+
+        next_cursor = None
+        paginated = 'cursor' in params or 'limit' in params
+        if paginated:
+            try:
+                limit = int(params.get('limit', settings.COLORS_PAGE_SIZE))
+            except ValueError as err:
+                raise HTTPException(400,
+                                    detail=f"Invalid limit: {err}") from err
+            if limit < 1:
+                raise HTTPException(400, detail="limit must be positive")
+            snapshot.sort()
+            start = 0
+            if params.get('cursor'):
+                start = bisect_right([dpid for dpid, _ in snapshot],
+                                     params['cursor'])
+            if start + limit < len(snapshot):
+                next_cursor = snapshot[start + limit - 1][0]
+            snapshot = snapshot[start:start + limit]
+
+        if params.get('format') == 'ndjson':
+            headers = {'X-Next-Cursor': next_cursor} if next_cursor else None
+            return StreamingResponse(self._ndjson_colors(snapshot),
+                                     media_type='application/x-ndjson',
+                                     headers=headers)
+        response = {'colors': self._encode_snapshot(snapshot)}
+        if paginated:
+            response['next_cursor'] = next_cursor
+        return JSONResponse(response)
+
+    @rest('colors/{dpid}')
+    def rest_switch_color(self, request: Request) -> JSONResponse:
+        """ Color of a single switch."""
+        dpid = request.path_params['dpid']
+        colors = self._encode_snapshot(self._colors_snapshot([dpid]))
+        if dpid not in colors:
+            raise HTTPException(404, detail=f"Switch {dpid} not found")
+        return JSONResponse(colors[dpid])
+
+    @rest('/aggregation', methods=['GET'])
+    def rest_aggregation(self, _request: Request) -> JSONResponse:
+        """ Flow entries saved by masked matches on each switch."""
+        return JSONResponse({'switches': self._aggregation_report()})
+
+    @rest('/flow_mods/rate', methods=['GET'])
+    def rest_flow_mods_rate(self, _request: Request) -> JSONResponse:
+        """ Token buckets and queue depth of rate limited switches."""
+        return JSONResponse(self._rate_limiter.status())
+
+    @rest('/flows/pending', methods=['GET'])
+    def rest_pending_flows(self, _request: Request) -> JSONResponse:
+        """ List of coloring flows not confirmed by flow_manager."""
+        return JSONResponse({'flows': self._flow_tracker.pending()})
+
+    @rest('/profiling', methods=['POST'])
+    def rest_start_profiling(self, request: Request) -> JSONResponse:
+        """ Profile the coloring handlers for some seconds or invocations.
+
+        Body fields, all optional:
+            seconds: stop profiling after this many seconds
+            invocations: stop profiling after this many handler calls
+            sample_every: run cProfile on one every sample_every calls,
+                1 profiles every call
+        """
+        body = get_json_or_400(request, self.controller.loop)
+        if not isinstance(body, dict):
+            raise HTTPException(400, detail="Expected a JSON object")
+        options = {}
+        for key, kind in (('seconds', float), ('invocations', int),
+                          ('sample_every', int)):
+            if body.get(key) is None:
+                continue
+            try:
+                options[key] = kind(body[key])
+            except (TypeError, ValueError) as err:
+                raise HTTPException(400,
+                                    detail=f"Invalid {key}: {err}") from err
+            if options[key] <= 0:
+                raise HTTPException(400, detail=f"{key} must be positive")
+        if 'seconds' not in options and 'invocations' not in options:
+            options['seconds'] = settings.PROFILING_DEFAULT_SECONDS
+        if not self._profiler.start(**options):
+            raise HTTPException(409, detail="Profiling is already active")
+        return JSONResponse(self._profiler.summary(), status_code=201)
+
+    @rest('/profiling', methods=['DELETE'])
+    def rest_stop_profiling(self, _request: Request) -> JSONResponse:
+        """ Stop profiling the coloring handlers."""
+        self._profiler.stop()
+        return JSONResponse(self._profiler.summary())
+
+    @rest('/profiling', methods=['GET'])
+    def rest_profiling(self, _request: Request) -> JSONResponse:
+        """ Handler timings, lock waits and the functions with the highest
+        cumulative time of the last profiling."""
+        return JSONResponse(self._profiler.summary())
+
+    @rest('/profiling/profile', methods=['GET'])
+    def rest_profiling_profile(self, _request: Request) -> Response:
+        """ Download the last profile, to be loaded with pstats."""
+        data = self._profiler.profile_data()
+        if data is None:
+            raise HTTPException(404, detail="No profile was collected")
+        headers = {'Content-Disposition':
+                   'attachment; filename="coloring.prof"'}
+        return Response(data, media_type='application/octet-stream',
+                        headers=headers)
 
     @staticmethod
     @rest('/settings', methods=['GET'])
@@ -242,6 +965,7 @@ class Main(KytosNApp):
         """
         settings_dict = {}
         settings_dict['color_field'] = settings.COLOR_FIELD
+        settings_dict['coloring_mode'] = settings.COLORING_MODE
         settings_dict['coloring_interval'] = settings.COLORING_INTERVAL
         settings_dict['topology_url'] = settings.TOPOLOGY_URL
         settings_dict['flow_manager_url'] = settings.FLOW_MANAGER_URL
@@ -269,6 +993,8 @@ class Main(KytosNApp):
         """Handle a recently table enabled.
         Coloring only allows "base" as flow group
         """
+        if self._recorder:
+            self._recorder.enable_table(event.content)
         table_group = event.content.get("coloring", None)
         if not table_group:
             return
@@ -291,6 +1017,7 @@ class Main(KytosNApp):
         with self._switches_lock:
             for _, content in self.switches.items():
                 flows = content["flows"]
-                for _, flow in flows.items():
+                masked_flows = content.get("masked_flows") or {}
+                for flow in chain(flows.values(), masked_flows.values()):
                     group = flow['table_group']
                     flow['table_id'] = self.table_group[group]
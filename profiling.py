@@ -0,0 +1,226 @@
+"""On demand profiling of the coloring handlers."""
+import cProfile
+import marshal
+import pstats
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TimedLock:
+    """Lock wrapper measuring how long acquiring the lock waits."""
+
+    def __init__(self, lock, clock: Callable[[], float] = time.perf_counter):
+        self.lock = lock
+        self._clock = clock
+        self._stats_lock = threading.Lock()
+        self.acquisitions = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        """Acquire the wrapped lock, recording the wait."""
+        start = self._clock()
+        acquired = self.lock.acquire(blocking, timeout)
+        wait = self._clock() - start
+        with self._stats_lock:
+            self.acquisitions += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return acquired
+
+    def release(self) -> None:
+        """Release the wrapped lock."""
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_exc):
+        self.release()
+
+    def stats(self) -> dict:
+        """Lock wait times, in seconds."""
+        with self._stats_lock:
+            return {'acquisitions': self.acquisitions,
+                    'wait_total': self.wait_total,
+                    'wait_max': self.wait_max}
+
+
+class HandlerProfiler:
+    """Profile methods of an object for some seconds or invocations.
+
+    While active, the methods are shadowed by instance attributes timing
+    each call, and one every ``sample_every`` outermost calls also runs
+    under cProfile. The lock ``lock_attr`` is wrapped by a TimedLock. When
+    stopped, the instance attributes are removed, so profiling costs
+    nothing when it's off.
+    """
+
+    def __init__(self, target, names: list[str],
+                 lock_attr: str = '_switches_lock',
+                 clock: Callable[[], float] = time.monotonic):
+        self.target = target
+        self.names = names
+        self.lock_attr = lock_attr
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Only one cProfile can be enabled at a time
+        self._cprofile_slot = threading.Lock()
+        self._local = threading.local()
+        self.active = False
+        self._reset(None, None, 1)
+
+    def _reset(self, seconds: Optional[float], invocations: Optional[int],
+               sample_every: int) -> None:
+        """Clear the collected data."""
+        self.seconds = seconds
+        self.invocations = invocations
+        self.sample_every = sample_every
+        self.started = self.stopped = None
+        self.calls = 0
+        self.profiled_calls = 0
+        self.handlers = {}
+        self._stats = None
+        self._timed_lock = None
+        self._lock_stats = None
+
+    def start(self, seconds: Optional[float] = None,
+              invocations: Optional[int] = None,
+              sample_every: int = 1) -> bool:
+        """Start profiling, returning False if it's already active."""
+        with self._lock:
+            if self.active:
+                return False
+            self._reset(seconds, invocations, sample_every)
+            self.started = self._clock()
+            self.active = True
+            for name in self.names:
+                setattr(self.target, name,
+                        self._wrap(name, getattr(self.target, name)))
+            self._timed_lock = TimedLock(getattr(self.target,
+                                                 self.lock_attr))
+            setattr(self.target, self.lock_attr, self._timed_lock)
+            return True
+
+    def stop(self) -> bool:
+        """Stop profiling, returning False if it wasn't active."""
+        with self._lock:
+            if not self.active:
+                return False
+            self.active = False
+            self.stopped = self._clock()
+            for name in self.names:
+                self.target.__dict__.pop(name, None)
+            # Holders of the TimedLock still release the same lock
+            setattr(self.target, self.lock_attr, self._timed_lock.lock)
+            self._lock_stats = self._timed_lock.stats()
+            return True
+
+    def expired(self) -> bool:
+        """Whether the seconds or invocations to profile are over."""
+        if self.seconds is not None and \
+                self._clock() - self.started >= self.seconds:
+            return True
+        return self.invocations is not None and \
+            self.calls >= self.invocations
+
+    def check(self) -> None:
+        """Stop profiling if it's expired."""
+        if self.active and self.expired():
+            self.stop()
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+        """Time calls of a method, profiling the sampled ones."""
+        local = self._local
+
+        def profiled(*args, **kwargs):
+            depth = getattr(local, 'depth', 0)
+            profile = None
+            if depth == 0:
+                with self._lock:
+                    self.calls += 1
+                    sampled = (self.calls - 1) % self.sample_every == 0
+                # Not a with block, a busy slot skips cProfile instead of
+                # waiting, and the slot is released after runcall below
+                # pylint: disable=consider-using-with
+                if sampled and self._cprofile_slot.acquire(blocking=False):
+                    profile = cProfile.Profile()
+            local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                if profile is None:
+                    return method(*args, **kwargs)
+                try:
+                    return profile.runcall(method, *args, **kwargs)
+                finally:
+                    self._cprofile_slot.release()
+            finally:
+                elapsed = time.perf_counter() - start
+                local.depth = depth
+                self._record(name, elapsed, profile)
+                if depth == 0:
+                    self.check()
+
+        return profiled
+
+    def _record(self, name: str, elapsed: float,
+                profile: Optional[cProfile.Profile]) -> None:
+        """Add a call to the handler timings and the merged profile."""
+        with self._lock:
+            handler = self.handlers.setdefault(
+                name, {'calls': 0, 'total': 0.0, 'max': 0.0}
+            )
+            handler['calls'] += 1
+            handler['total'] += elapsed
+            handler['max'] = max(handler['max'], elapsed)
+            if profile is None:
+                return
+            self.profiled_calls += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def summary(self, limit: int = 20) -> dict:
+        """JSON summary with the handler timings, the lock waits and the
+        functions with the highest cumulative time."""
+        self.check()
+        with self._lock:
+            end = self._clock() if self.active else self.stopped
+            functions = []
+            if self._stats is not None:
+                entries = sorted(self._stats.stats.items(),
+                                 key=lambda item: item[1][3], reverse=True)
+                for (filename, line, function), entry in entries[:limit]:
+                    functions.append({
+                        'function': f"{filename}:{line}({function})",
+                        'calls': entry[1],
+                        'total_time': entry[2],
+                        'cumulative_time': entry[3],
+                    })
+            lock_wait = self._lock_stats
+            if self.active:
+                lock_wait = self._timed_lock.stats()
+            return {
+                'active': self.active,
+                'elapsed': (end - self.started
+                            if self.started is not None else 0.0),
+                'seconds': self.seconds,
+                'invocations': self.invocations,
+                'sample_every': self.sample_every,
+                'calls': self.calls,
+                'profiled_calls': self.profiled_calls,
+                'handlers': {name: dict(handler)
+                             for name, handler in self.handlers.items()},
+                'lock_wait': lock_wait,
+                'functions': functions,
+            }
+
+    def profile_data(self) -> Optional[bytes]:
+        """Merged profile in the pstats format, as dump_stats writes it."""
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
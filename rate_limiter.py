@@ -0,0 +1,113 @@
+"""Per switch rate limiting of flow mods."""
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable
+
+from napps.amlight.coloring.flow_tracker import match_key
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        """Add the tokens earned since the last refill."""
+        elapsed = max(now - self.updated, 0)
+        self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def take(self, count: int) -> int:
+        """Take up to ``count`` tokens, returning how many were taken."""
+        count = min(count, int(self.tokens))
+        self.tokens -= count
+        return count
+
+
+class FlowModRateLimiter:
+    """Queue flow mods per switch and release them as their buckets allow.
+
+    Switches with queued flow mods are served in round-robin, so a slow
+    switch doesn't hold back the others.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = Lock()
+        self._buckets = {}
+        # dpid -> deque of (action, force, flow)
+        self._queues = {}
+        self._order = deque()
+
+    def submit(self, dpid: str, action: str, force: bool, flows: list[dict],
+               limit: tuple[float, int]) -> None:
+        """Queue flow mods of a switch limited by its (rate, burst) token
+        bucket.
+
+        A delete drops the queued installs of its matches, which would
+        install the deleted flows again once it's sent."""
+        rate, burst = limit
+        with self._lock:
+            bucket = self._buckets.get(dpid)
+            if bucket is None:
+                self._buckets[dpid] = TokenBucket(rate, burst, self._clock())
+            else:
+                bucket.rate, bucket.burst = rate, burst
+            queue = self._queues.get(dpid)
+            if queue is None:
+                queue = self._queues[dpid] = deque()
+                self._order.append(dpid)
+            elif action == "delete":
+                deleted = {match_key(flow['match']) for flow in flows}
+                kept = [item for item in queue if item[0] != "install"
+                        or match_key(item[2]['match']) not in deleted]
+                queue.clear()
+                queue.extend(kept)
+            queue.extend((action, force, flow) for flow in flows)
+
+    def dispatch(self) -> list[tuple[str, str, bool, list[dict]]]:
+        """Release the flow mods allowed by each bucket.
+
+        Consecutive flow mods of the same action are batched together as
+        (dpid, action, force, flows)."""
+        now = self._clock()
+        batches = []
+        with self._lock:
+            for _ in range(len(self._order)):
+                dpid = self._order.popleft()
+                queue = self._queues[dpid]
+                bucket = self._buckets[dpid]
+                bucket.refill(now)
+                for _ in range(bucket.take(len(queue))):
+                    action, force, flow = queue.popleft()
+                    if not batches or batches[-1][:3] != (dpid, action,
+                                                          force):
+                        batches.append((dpid, action, force, []))
+                    batches[-1][3].append(flow)
+                if queue:
+                    self._order.append(dpid)
+                else:
+                    del self._queues[dpid]
+        return batches
+
+    def status(self) -> dict:
+        """Bucket state and queue depth of each rate limited switch."""
+        now = self._clock()
+        with self._lock:
+            switches = {}
+            for dpid, bucket in self._buckets.items():
+                bucket.refill(now)
+                switches[dpid] = {
+                    'rate': bucket.rate,
+                    'burst': bucket.burst,
+                    'tokens': bucket.tokens,
+                    'queue': len(self._queues.get(dpid, ())),
+                }
+            return {'switches': switches,
+                    'queue': sum(len(queue) for queue in
+                                 self._queues.values())}
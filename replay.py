@@ -0,0 +1,286 @@
+"""Record the input events of the coloring NApp and replay them.
+
+The recorder writes one JSON object per line to a gzip file, with the time
+of the event since the recording started. The replayer feeds the events to
+a Main with stand-in controller, switch and link objects, measuring the
+handlers latency and the flow mods they emit.
+
+Usage::
+
+    python3 -m napps.amlight.coloring.replay trace.ndjson.gz --speed 10
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from collections import defaultdict
+from threading import Lock
+from types import SimpleNamespace
+from typing import Callable, Iterable, Optional
+
+from kytos.core.common import EntityStatus
+from kytos.core.events import KytosEvent
+
+TOPOLOGY_UPDATED = 'topology.updated'
+LINK_DISABLED = 'link.disabled'
+SWITCH_DISABLED = 'switch.disabled'
+SWITCH_ENABLED = 'switch.enabled'
+HANDSHAKE_COMPLETED = 'handshake.completed'
+CONNECTION_LOST = 'connection.lost'
+ENABLE_TABLE = 'enable_table'
+
+
+def switch_state(switch) -> list:
+    """Compact state of a switch: [dpid, ofp_version, enabled, active]."""
+    return [switch.dpid, switch.ofp_version, switch.is_enabled(),
+            switch.is_active()]
+
+
+def link_state(link) -> list:
+    """Compact state of a link: [dpid_a, dpid_b, enabled]."""
+    return [link.endpoint_a.switch.dpid, link.endpoint_b.switch.dpid,
+            link.is_enabled()]
+
+
+class EventRecorder:
+    """Append the input events of the NApp to a gzip NDJSON file."""
+
+    def __init__(self, path: str,
+                 clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._start = clock()
+        self._lock = Lock()
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def record(self, event: str, **content) -> None:
+        """Write an event, flushed so that a crash keeps the trace."""
+        line = json.dumps({'t': round(self._clock() - self._start, 6),
+                           'event': event, **content},
+                          separators=(',', ':'))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def topology_updated(self, switches: Iterable, links: Iterable) -> None:
+        """Record a topology update with the switches of the controller."""
+        self.record(TOPOLOGY_UPDATED,
+                    switches=[switch_state(switch) for switch in switches],
+                    links=[link_state(link) for link in links])
+
+    def link_disabled(self, link) -> None:
+        """Record a disabled link."""
+        self.record(LINK_DISABLED, link=link_state(link))
+
+    def switch_disabled(self, dpid: str) -> None:
+        """Record a disabled switch."""
+        self.record(SWITCH_DISABLED, dpid=dpid)
+
+    def switch_status(self, event: str, switch) -> None:
+        """Record an enabled or connected switch."""
+        self.record(event, switch=switch_state(switch))
+
+    def connection_lost(self, dpid: str) -> None:
+        """Record a disconnected switch."""
+        self.record(CONNECTION_LOST, dpid=dpid)
+
+    def enable_table(self, content: dict) -> None:
+        """Record a table group change."""
+        self.record(ENABLE_TABLE, content=content)
+
+    def close(self) -> None:
+        """Close the file."""
+        with self._lock:
+            self._file.close()
+
+
+def load_events(path: str) -> list[dict]:
+    """Read a recorded trace. A trace cut short by a crash is read up to
+    its last complete event."""
+    events = []
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        try:
+            for line in file:
+                if line.endswith('\n'):
+                    events.append(json.loads(line))
+        except EOFError:
+            pass
+    return events
+
+
+class ReplaySwitch:
+    """Stand-in switch, its status is derived like kytos.core.switch.Switch
+    does it."""
+
+    def __init__(self, dpid: str, ofp_version: str, enabled: bool,
+                 active: bool):
+        self.dpid = dpid
+        self.ofp_version = ofp_version
+        self.enabled = enabled
+        self.active = active
+
+    def is_enabled(self) -> bool:
+        """Return whether the switch is enabled."""
+        return self.enabled
+
+    def is_active(self) -> bool:
+        """Return whether the switch is connected."""
+        return self.active
+
+    @property
+    def status(self) -> EntityStatus:
+        """Return the switch status."""
+        if self.enabled:
+            return EntityStatus.UP if self.active else EntityStatus.DOWN
+        return EntityStatus.DISABLED
+
+
+class ReplayLink:
+    """Stand-in link between two switches."""
+
+    def __init__(self, dpid_a: str, dpid_b: str, enabled: bool):
+        self.endpoint_a = SimpleNamespace(switch=SimpleNamespace(dpid=dpid_a))
+        self.endpoint_b = SimpleNamespace(switch=SimpleNamespace(dpid=dpid_b))
+        self.enabled = enabled
+
+    def is_enabled(self) -> bool:
+        """Return whether the link is enabled."""
+        return self.enabled
+
+
+class Replayer:
+    """Feed recorded events to a NApp built with a stand-in controller."""
+
+    def __init__(self, napp_cls=None):
+        if napp_cls is None:
+            # pylint: disable=import-outside-toplevel
+            from napps.amlight.coloring.main import Main
+            napp_cls = Main
+        # pylint: disable=import-outside-toplevel
+        from kytos.lib.helpers import get_controller_mock
+        self.switches = {}
+        self.flow_mods = defaultdict(int)
+        controller = get_controller_mock()
+        controller.switches = self.switches
+        controller.get_switch_by_dpid = self.switches.get
+        controller.buffers = SimpleNamespace(
+            app=SimpleNamespace(put=self._count_flow_mods,
+                                aput=self._acount_flow_mods)
+        )
+        self.napp = napp_cls(controller)
+
+    def _count_flow_mods(self, event: KytosEvent) -> None:
+        """Count the flow mods sent to flow_manager."""
+        if event.name.startswith('kytos.flow_manager.flows.'):
+            action = event.name.rsplit('.', 1)[-1]
+            self.flow_mods[action] += len(event.content['flow_dict']['flows'])
+
+    async def _acount_flow_mods(self, event: KytosEvent) -> None:
+        """Count the flow mods sent to flow_manager."""
+        self._count_flow_mods(event)
+
+    def _update_switch(self, state: list) -> ReplaySwitch:
+        """Create or update the stand-in switch of a recorded state."""
+        dpid, ofp_version, enabled, active = state
+        switch = self.switches.get(dpid)
+        if switch is None:
+            switch = self.switches[dpid] = ReplaySwitch(*state)
+        else:
+            switch.ofp_version = ofp_version
+            switch.enabled, switch.active = enabled, active
+        return switch
+
+    def handle(self, event: dict) -> None:
+        """Call the handler of a recorded event."""
+        napp = self.napp
+        kind = event['event']
+        if kind == TOPOLOGY_UPDATED:
+            for state in event['switches']:
+                self._update_switch(state)
+            links = {index: ReplayLink(*state)
+                     for index, state in enumerate(event['links'])}
+            napp.handle_topology_updated(SimpleNamespace(links=links))
+        elif kind == LINK_DISABLED:
+            napp.handle_link_disabled(ReplayLink(*event['link']))
+        elif kind == SWITCH_DISABLED:
+            if event['dpid'] in self.switches:
+                self.switches[event['dpid']].enabled = False
+            napp.handle_switch_disabled(event['dpid'])
+        elif kind == SWITCH_ENABLED:
+            napp.handle_switch_status(self._update_switch(event['switch']))
+        elif kind == HANDSHAKE_COMPLETED:
+            switch = self._update_switch(event['switch'])
+            napp.handle_switch_status(switch)
+            napp.handle_switch_resync(switch.dpid)
+        elif kind == CONNECTION_LOST:
+            if event['dpid'] in self.switches:
+                self.switches[event['dpid']].active = False
+            napp.handle_switch_down(event['dpid'])
+        elif kind == ENABLE_TABLE:
+            asyncio.run(napp.on_table_enabled(KytosEvent(
+                name='kytos/of_multi_table.enable_table',
+                content=event['content']
+            )))
+        else:
+            raise ValueError(f"Unknown event {kind}")
+
+    # pylint: disable=protected-access
+    def replay(self, events: list[dict],
+               speed: Optional[float] = None) -> dict:
+        """Replay events, at ``speed`` times their original pace, or as
+        fast as possible when speed is None.
+
+        Returns the latency of the handlers, in seconds, and the flow mods
+        emitted, per event."""
+        latencies = defaultdict(list)
+        flow_mods = defaultdict(lambda: defaultdict(int))
+        start = time.monotonic()
+        for event in events:
+            if speed:
+                delay = start + event['t'] / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            before = dict(self.flow_mods)
+            handler_start = time.perf_counter()
+            self.handle(event)
+            latencies[event['event']].append(
+                time.perf_counter() - handler_start
+            )
+            # Rate limited flow mods are released by the execute loop
+            self.napp._dispatch_flow_mods()
+            for action, count in self.flow_mods.items():
+                flow_mods[event['event']][action] += (count -
+                                                      before.get(action, 0))
+
+        report = {}
+        for kind, values in latencies.items():
+            values.sort()
+            report[kind] = {
+                'count': len(values),
+                'total': sum(values),
+                'p50': values[(len(values) - 1) // 2],
+                'p99': values[(len(values) - 1) * 99 // 100],
+                'max': values[-1],
+                'flow_mods': dict(flow_mods[kind]),
+            }
+        return {'events': report,
+                'elapsed': time.monotonic() - start,
+                'flow_mods': dict(self.flow_mods)}
+
+
+def main() -> None:
+    """Replay a trace and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='gzip NDJSON trace')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='replay at this many times the original pace,'
+                             ' as fast as possible when omitted')
+    args = parser.parse_args()
+    report = Replayer().replay(load_events(args.path), args.speed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,75 @@
 """NApp settings."""
 COLORING_INTERVAL = 10
 COLOR_FIELD = 'dl_src'
+# 'dpid' colors each switch with its dpid, 'distance2' uses the smallest
+# colors that are unique within 2 hops of each switch, which lets narrow
+# color fields, such as dl_vlan or nw_tos, fit large topologies. With
+# COLOR_TABLE_PATH set, 'distance2' starts from the colors of the previous
+# run, otherwise a reloaded NApp colors from scratch and the flows matching
+# colors that changed are left on the switches
+COLORING_MODE = 'dpid'
 FLOW_MANAGER_URL = 'http://localhost:8181/api/kytos/flow_manager/v2/flows/%s'
 TOPOLOGY_URL = 'http://localhost:8181/api/kytos/topology/v3/links'
 COOKIE_PREFIX = 0xAC
 TABLE_GROUP_ALLOWED = {"base"}
+
+# Failed or unconfirmed coloring flows are retried with an exponential
+# backoff, in seconds, checked every FLOW_RETRY_INTERVAL seconds
+FLOW_RETRY_INTERVAL = 5
+FLOW_RETRY_BACKOFF_BASE = 10
+FLOW_RETRY_BACKOFF_MAX = 600
+
+# Flow mods of a switch can be limited by a token bucket given as
+# (flow mods per second, burst). A dpid rate takes precedence over an
+# ofp_version rate, which takes precedence over the default. None means
+# no limit. Queued flow mods are released every FLOW_MOD_DISPATCH_INTERVAL
+# seconds.
+FLOW_MOD_RATE_DEFAULT = None
+FLOW_MOD_RATE_BY_OFP_VERSION = {}
+FLOW_MOD_RATE_BY_DPID = {}
+FLOW_MOD_DISPATCH_INTERVAL = 0.5
+
+# Flows whose neighbor is gone are deleted after each topology update, up to
+# this many per update
+STALE_FLOWS_MAX_PER_UPDATE = 1000
+
+# Cover the neighbor colors of each switch with masked matches, instead of
+# one exact match per neighbor, whenever it saves flow entries. It requires
+# COLORING_MODE 'distance2', whose colors are then assigned so that the
+# neighbors of each switch share aligned blocks, and is ignored otherwise.
+# Only dl_src, dl_dst, nw_src and nw_dst support it, and no more than the
+# lowest MASKED_MATCHES_MAX_WILDCARD_BITS bits are wildcarded, which bounds
+# the non probe traffic that could be matched. The installs of a switch wait
+# up to MASKED_MATCHES_DELETE_TIMEOUT seconds for flow_manager to report the
+# deletion of its masked flows, which would delete them otherwise
+MASKED_MATCHES = False
+MASKED_MATCHES_MAX_WILDCARD_BITS = 8
+MASKED_MATCHES_DELETE_TIMEOUT = 10
+
+# Default page size of GET colors when paginated, and how many colors are
+# encoded at a time when streamed
+COLORS_PAGE_SIZE = 1000
+COLORS_CHUNK_SIZE = 1000
+
+# Handlers profiled by POST profiling, and how long profiling lasts when
+# neither seconds nor invocations are given
+PROFILED_HANDLERS = [
+    'handle_topology_updated',
+    'update_colors_from_pairs',
+    '_switch_colors',
+    '_colors_snapshot',
+    '_encode_snapshot',
+    'handle_link_disabled',
+    'handle_switch_disabled',
+    'handle_switch_resync',
+]
+PROFILING_DEFAULT_SECONDS = 60
+
+# Path of a gzip NDJSON file recording the input events of the NApp, to be
+# replayed with python3 -m napps.amlight.coloring.replay. None disables it
+EVENT_RECORD_PATH = None
+
+# Path of a binary, memory-mappable table with the dpid, color, color field
+# value and degree of each switch, rewritten atomically when it changes, for
+# external consumers. None disables it. See color_table.py for the format
+COLOR_TABLE_PATH = None
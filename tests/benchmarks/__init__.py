@@ -0,0 +1,5 @@
+"""NApp benchmarks.
+
+Run them from the NApp directory, e.g.
+``python3 -m tests.benchmarks.bench_utils``.
+"""
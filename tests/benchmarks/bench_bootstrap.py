@@ -0,0 +1,49 @@
+"""Benchmark the time-to-coloring after a NApp reload at 5k switches.
+
+The eager bootstrap colors the topology already known to the controller
+in setup. Without it, no flow is installed until the next
+kytos/topology.updated, which only comes with a topology change.
+"""
+import time
+
+from napps.amlight.coloring.main import Main
+from tests.benchmarks.helpers import make_link, make_napp, make_topology
+
+SIZE = 5000
+REPEAT = 5
+
+
+class LazyMain(Main):
+    """Main waiting for kytos/topology.updated, as before the bootstrap."""
+
+    def bootstrap(self) -> None:
+        pass
+
+
+def reload(napp_cls, switches: dict, links: dict) -> tuple[float, int]:
+    """Load a NApp, returning the time until its flows are handed to
+    flow_manager and how many were."""
+    installs = []
+
+    def put(event):
+        installs.extend(event.content['flow_dict']['flows'])
+
+    start = time.perf_counter()
+    make_napp(switches, napp_cls, links, put)
+    return time.perf_counter() - start, len(installs)
+
+
+def main() -> None:
+    """Run the benchmark on a NApp reload."""
+    switches, pairs = make_topology(SIZE)
+    links = {index: make_link(*pair) for index, pair in enumerate(pairs)}
+    print(f"{SIZE} switches, {len(links)} links, best of {REPEAT} reloads")
+    for name, napp_cls in (("lazy", LazyMain), ("bootstrap", Main)):
+        elapsed, installs = min(reload(napp_cls, switches, links)
+                                for _ in range(REPEAT))
+        print(f"{name:>12}: {installs:6} flows in {elapsed * 1000:8.2f} ms")
+    print("lazy installs the flows only after the next topology.updated")
+
+
+if __name__ == "__main__":
+    main()
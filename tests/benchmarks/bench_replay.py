@@ -0,0 +1,50 @@
+"""Benchmark a recorded trace with incident event orderings.
+
+A trace is recorded at 1k switches with links disabled before the topology
+update that removes them, and a switch disabled while its links are still
+up, then replayed as fast as possible. A real trace recorded with
+EVENT_RECORD_PATH can be replayed the same way with
+python3 -m napps.amlight.coloring.replay.
+"""
+import json
+import os
+import tempfile
+
+from napps.amlight.coloring.replay import (EventRecorder, Replayer,
+                                           load_events)
+from tests.benchmarks.helpers import make_link, make_topology
+
+SIZE = 1000
+
+
+def record_trace(path: str) -> None:
+    """Record the incident orderings."""
+    switches, pairs = make_topology(SIZE)
+    links = [make_link(*pair) for pair in pairs]
+    recorder = EventRecorder(path)
+    recorder.topology_updated(switches.values(), links)
+    # Links disabled before the topology update
+    for index in range(0, len(links), 50):
+        links[index] = make_link(*pairs[index], enabled=False)
+        recorder.link_disabled(links[index])
+    recorder.topology_updated(switches.values(), links)
+    # A switch disabled while its links are still up
+    dpid = next(iter(switches))
+    switches[dpid].enabled = False
+    recorder.switch_disabled(dpid)
+    recorder.topology_updated(switches.values(), links)
+    recorder.close()
+
+
+def main() -> None:
+    """Record and replay the trace."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trace.ndjson.gz')
+        record_trace(path)
+        print(f"{SIZE} switches, trace of {os.path.getsize(path)} bytes")
+        report = Replayer().replay(load_events(path))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark update_colors at 5k switches.
+
+The eligibility index is compared with the previous flow generation loop,
+which copied controller.switches and looked up each dpid on every event.
+"""
+# The legacy loop is kept as it was in main.py, to compare against it
+# pylint: disable=duplicate-code
+import timeit
+from collections import defaultdict
+
+from kytos.core.common import EntityStatus
+
+from napps.amlight.coloring.encoders import get_encoder
+from napps.amlight.coloring.main import Main
+from tests.benchmarks.helpers import make_napp, make_topology
+
+SIZE = 5000
+NUMBER = 20
+
+
+class LegacyMain(Main):
+    """update_colors as it was before the eligibility index."""
+
+    def update_colors_from_pairs(self, links):
+        with self._switches_lock:
+            for switch in self.controller.switches.copy().values():
+                if not switch.is_enabled():
+                    if switch.dpid in self.switches:
+                        self.switches[switch.dpid]['neighbors'] = set()
+                    continue
+                if switch.dpid not in self.switches:
+                    color = int(switch.dpid.replace(':', '')[4:], 16)
+                    self.switches[switch.dpid] = {'color': color,
+                                                  'neighbors': set(),
+                                                  'flows': {}}
+                else:
+                    self.switches[switch.dpid]['neighbors'] = set()
+            for source, target in links:
+                if source != target:
+                    self.switches[source]['neighbors'].add(target)
+                    self.switches[target]['neighbors'].add(source)
+
+        dpid_flows = defaultdict(list)
+        with self._switches_lock:
+            for dpid, switch_dict in self.switches.items():
+                switch = self.controller.get_switch_by_dpid(dpid)
+                if switch.status != EntityStatus.UP:
+                    continue
+                encoder = get_encoder(switch.ofp_version)
+                if encoder is None:
+                    continue
+                for neighbor in switch_dict['neighbors']:
+                    if neighbor not in switch_dict['flows']:
+                        flow_dict = self._build_flow(
+                            dpid, self.switches[neighbor]['color'], encoder
+                        )
+                        switch_dict['flows'][neighbor] = flow_dict
+                        dpid_flows[dpid].append(flow_dict)
+        self._send_flow_mods(dpid_flows, "install")
+
+
+def main() -> None:
+    """Run the benchmark on a steady state topology event."""
+    switches, links = make_topology(SIZE)
+    # A tenth of the switches are DOWN
+    for switch in list(switches.values())[::10]:
+        switch.connected = False
+    print(f"{SIZE} switches, {len(links)} links, best of {NUMBER} runs")
+    for name, napp_cls in (("legacy", LegacyMain), ("eligibility", Main)):
+        napp = make_napp(switches, napp_cls)
+        napp.update_colors_from_pairs(links)
+        best = min(timeit.repeat(
+            lambda napp=napp: napp.update_colors_from_pairs(links),
+            number=1, repeat=NUMBER
+        ))
+        print(f"{name:>12}: {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
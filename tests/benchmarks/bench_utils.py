@@ -0,0 +1,38 @@
+"""Benchmark the color encoding of utils.py."""
+import random
+import timeit
+
+from napps.amlight.coloring.main import Main
+from napps.amlight.coloring.utils import (colors_to_field,
+                                          make_unicast_local_mac,
+                                          unicast_local_mac)
+
+NUMBER = 10
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    rand = random.Random(0)
+    values = [rand.getrandbits(48) for _ in range(10000)]
+    macs = [value.to_bytes(6, "big").hex(":") for value in values]
+
+    cases = {
+        "make_unicast_local_mac": lambda: [
+            make_unicast_local_mac(mac) for mac in macs
+        ],
+        "unicast_local_mac": lambda: [
+            unicast_local_mac(value) for value in values
+        ],
+        "color_to_field": lambda: [
+            Main.color_to_field(value, "dl_src") for value in values
+        ],
+        "colors_to_field": lambda: colors_to_field(values, "dl_src"),
+    }
+    print(f"{len(values)} values, best of {NUMBER} runs")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=NUMBER))
+        print(f"{name:>24}: {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Stand-in controller objects for the benchmarks."""
+import random
+from types import SimpleNamespace
+
+from kytos.core.common import EntityStatus
+from kytos.lib.helpers import get_controller_mock
+
+from napps.amlight.coloring.main import Main
+
+
+class FakeSwitch:
+    """Switch with only the attributes used by coloring.
+
+    Its status is derived like kytos.core.switch.Switch does it."""
+
+    def __init__(self, dpid: str, ofp_version: str = '0x04'):
+        self.dpid = dpid
+        self.ofp_version = ofp_version
+        self.enabled = True
+        self.connected = True
+
+    def is_enabled(self) -> bool:
+        """Return whether the switch is enabled."""
+        return self.enabled
+
+    def is_active(self) -> bool:
+        """Return whether the switch is connected."""
+        return self.connected
+
+    @property
+    def status(self) -> EntityStatus:
+        """Return the switch status."""
+        if self.is_enabled():
+            if self.is_active():
+                return EntityStatus.UP
+            return EntityStatus.DOWN
+        return EntityStatus.DISABLED
+
+
+def make_link(dpid_a: str, dpid_b: str, enabled: bool = True):
+    """Build a link with only the attributes used by coloring."""
+    return SimpleNamespace(
+        endpoint_a=SimpleNamespace(switch=SimpleNamespace(dpid=dpid_a)),
+        endpoint_b=SimpleNamespace(switch=SimpleNamespace(dpid=dpid_b)),
+        is_enabled=lambda: enabled,
+    )
+
+
+def make_dpid(index: int) -> str:
+    """Build a dpid from an integer."""
+    return index.to_bytes(8, "big").hex(":")
+
+
+def make_topology(size: int, degree: int = 4, seed: int = 0):
+    """Build switches and enabled link pairs of a random topology."""
+    rand = random.Random(seed)
+    switches = {make_dpid(i): FakeSwitch(make_dpid(i))
+                for i in range(1, size + 1)}
+    dpids = list(switches)
+    links = []
+    for index, dpid in enumerate(dpids):
+        links.append((dpid, dpids[(index + 1) % size]))
+        for _ in range(degree // 2 - 1):
+            links.append((dpid, rand.choice(dpids)))
+    return switches, links
+
+
+def make_napp(switches: dict, napp_cls=Main, links: dict = None,
+              put=lambda event: None) -> Main:
+    """Build a NApp whose controller knows the given switches and links."""
+    controller = get_controller_mock()
+    controller.switches = switches
+    controller.links = links or {}
+    controller.get_switch_by_dpid = switches.get
+    controller.buffers = SimpleNamespace(
+        app=SimpleNamespace(put=put)
+    )
+    return napp_cls(controller)
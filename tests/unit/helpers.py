@@ -0,0 +1,29 @@
+"""Helpers shared by the unit tests."""
+from unittest.mock import Mock
+
+from kytos.core.common import EntityStatus
+
+
+class FakeClock:
+    """Clock moved by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_switches(count: int,
+                  dpid='00:00:00:00:00:00:00:{:02x}'.format) -> dict:
+    """Build count enabled and UP OpenFlow 1.3 switches by dpid, the dpid
+    of each one is built from its index, starting at 1."""
+    switches = {}
+    for index in range(1, count + 1):
+        switch = Mock()
+        switch.dpid = dpid(index)
+        switch.ofp_version = '0x04'
+        switch.status = EntityStatus.UP
+        switch.is_enabled = lambda: True
+        switches[switch.dpid] = switch
+    return switches
@@ -0,0 +1,79 @@
+"""Test aggregation.py."""
+import random
+
+import pytest
+
+from napps.amlight.coloring.aggregation import (MASKABLE_FIELDS,
+                                                block_color_valid,
+                                                field_value, masked_match,
+                                                prefix_cover)
+from napps.amlight.coloring.main import Main
+
+
+def covers(entries: list, value: int, width: int) -> bool:
+    """Whether any (value, prefix length) entry matches the value."""
+    return any(value >> (width - prefix_len) == entry >> (width - prefix_len)
+               for entry, prefix_len in entries)
+
+
+@pytest.mark.parametrize("field", sorted(MASKABLE_FIELDS))
+def test_field_value(field) -> None:
+    """test field_value formats just like color_to_field."""
+    rand = random.Random(0)
+    width = MASKABLE_FIELDS[field]
+    for color in [rand.getrandbits(48) for _ in range(500)] + [0, 1, 300]:
+        value = field_value(color, field)
+        assert masked_match(value, width, field) == \
+            Main.color_to_field(color, field)
+
+
+def test_block_color_valid() -> None:
+    """test block_color_valid keeps MAC values in their color block."""
+    assert block_color_valid("nw_src", 8) is None
+    valid = block_color_valid("dl_src", 8)
+    assert [color for color in range(0x300) if not valid(color)] == [
+        0, 0xee, 0x100, 0x1ee, 0x200, 0x2ee
+    ]
+    valid = block_color_valid("dl_src", 10)
+    assert not valid(0x10001) and valid(0x10101)
+    for block in range(0, 0x1000, 0x100):
+        values = {field_value(color, "dl_src") >> 8
+                  for color in range(block, block + 0x100) if valid(color)}
+        assert len(values) <= 1
+
+
+def test_masked_match() -> None:
+    """test masked_match."""
+    assert masked_match(0xeeeeeeeeee00, 40, "dl_src") == \
+        "ee:ee:ee:ee:ee:00/ff:ff:ff:ff:ff:00"
+    assert masked_match(0x0a000000, 24, "nw_src") == "10.0.0.0/24"
+    assert masked_match(0x0a000001, 32, "nw_dst") == "10.0.0.1"
+
+
+def test_prefix_cover() -> None:
+    """test prefix_cover aggregates contiguous values."""
+    assert prefix_cover({1, 2, 3}, [1, 2, 3, 9], 48, 40) == [(0, 45)]
+    assert prefix_cover({1, 2, 3}, [1, 2, 3], 48, 40) == [(0, 40)]
+    # Values not in use, like 0, can be matched
+    assert prefix_cover({1, 3}, [1, 2, 3], 48, 40) == [(0, 47), (3, 48)]
+    assert not prefix_cover(set(), [1, 2, 3], 48, 40)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_prefix_cover_matches_no_other_color(seed) -> None:
+    """test prefix_cover matches every neighbor color and no other color
+    in use, on random topologies."""
+    rand = random.Random(seed)
+    width = 48
+    min_prefix = rand.choice([0, 32, 40, 44])
+    colors = [rand.choice([rand.getrandbits(8), rand.getrandbits(16),
+                           rand.getrandbits(48)])
+              for _ in range(rand.randint(1, 500))]
+    values = [field_value(color, "dl_src") for color in colors]
+    ordered = sorted(set(values))
+    for _ in range(50):
+        neighbors = set(rand.sample(values, rand.randint(0, len(values))))
+        entries = prefix_cover(neighbors, ordered, width, min_prefix)
+        assert all(prefix_len >= min_prefix for _, prefix_len in entries)
+        for value in ordered:
+            assert covers(entries, value, width) == (value in neighbors)
@@ -0,0 +1,65 @@
+"""Test color_table.py."""
+import pytest
+
+from napps.amlight.coloring.color_table import (HEADER, RECORD, ColorTable,
+                                                field_int, format_field,
+                                                int_to_dpid, pack_records,
+                                                read_colors,
+                                                read_generation,
+                                                write_color_table)
+
+
+@pytest.mark.parametrize("field,value", [
+    ('dl_src', 'ee:ee:ee:ee:01:2c'),
+    ('nw_dst', '0.0.1.44'),
+    ('dl_vlan', 300),
+])
+def test_field_int(field, value) -> None:
+    """Test field values are converted to integers and back."""
+    assert format_field(field_int(value), field) == value
+
+
+def test_write_and_read(tmp_path) -> None:
+    """Test a written table is read back sorted by dpid."""
+    path = str(tmp_path / 'colors.bin')
+    records = pack_records([(3, 30, 300, 1), (1, 10, 100, 2)])
+    assert len(records) == 2 * RECORD.size
+    write_color_table(path, 'dl_src', 7, records)
+    assert (tmp_path / 'colors.bin').stat().st_size == \
+        HEADER.size + 2 * RECORD.size
+    assert [path.name for path in tmp_path.iterdir()] == ['colors.bin']
+    assert (tmp_path / 'colors.bin').stat().st_mode & 0o777 == 0o644
+    assert read_generation(path) == 7
+    assert read_colors(path, 'dl_src') == {int_to_dpid(1): 10,
+                                           int_to_dpid(3): 30}
+    assert not read_colors(path, 'nw_tos')
+
+    with ColorTable(path) as table:
+        assert table.field == 'dl_src'
+        assert table.generation == 7
+        assert len(table) == 2
+        assert list(table) == [(1, 10, 100, 2), (3, 30, 300, 1)]
+        assert table.find(3).color == 30
+        assert table.find(int_to_dpid(1)).value == 100
+        assert table.find(2) is None
+        assert table.find(4) is None
+        with pytest.raises(IndexError):
+            table[2]  # pylint: disable=pointless-statement
+
+
+def test_read_invalid(tmp_path) -> None:
+    """Test invalid tables are rejected."""
+    path = str(tmp_path / 'colors.bin')
+    write_color_table(path, 'dl_src', 1, pack_records([(1, 1, 1, 1)]))
+    data = (tmp_path / 'colors.bin').read_bytes()
+
+    (tmp_path / 'colors.bin').write_bytes(b'XXXX' + data[4:])
+    with pytest.raises(ValueError):
+        ColorTable(path)
+    assert read_generation(path) == 0
+    assert read_generation(str(tmp_path / 'missing.bin')) == 0
+    assert not read_colors(path, 'dl_src')
+    assert not read_colors(str(tmp_path / 'missing.bin'), 'dl_src')
+    (tmp_path / 'colors.bin').write_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        ColorTable(path)
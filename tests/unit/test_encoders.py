@@ -0,0 +1,52 @@
+"""Test encoders.py."""
+from unittest.mock import Mock
+
+import pytest
+
+from napps.amlight.coloring.encoders import (ENCODERS, ColorEncoder,
+                                             get_encoder, register_encoder)
+
+
+@pytest.mark.parametrize("ofp_version", ["0x04", "0x06"])
+def test_get_encoder(ofp_version) -> None:
+    """Test get_encoder with fake switches of each supported version."""
+    switch = Mock()
+    switch.ofp_version = ofp_version
+    encoder = get_encoder(switch.ofp_version)
+    assert encoder.ofp_version == ofp_version
+    assert encoder is get_encoder(switch.ofp_version)
+    assert encoder.match('dl_src', 'ee:ee:ee:ee:ee:01') == {
+        'dl_src': 'ee:ee:ee:ee:ee:01'
+    }
+    assert encoder.actions() == [
+        {'action_type': 'output', 'port': 0xfffffffd}
+    ]
+
+
+@pytest.mark.parametrize("ofp_version", ["0x01", None, "unknown"])
+def test_get_encoder_unsupported(ofp_version) -> None:
+    """Test get_encoder with unsupported versions."""
+    switch = Mock()
+    switch.ofp_version = ofp_version
+    assert get_encoder(switch.ofp_version) is None
+
+
+def test_register_encoder() -> None:
+    """Test register_encoder clears the cached lookups."""
+    assert get_encoder('0x01') is None
+
+    @register_encoder
+    class ColorEncoderV0x01(ColorEncoder):
+        """OpenFlow 1.0 encoder."""
+        ofp_version = '0x01'
+        controller_port = 0xfffd
+
+    try:
+        encoder = get_encoder('0x01')
+        assert isinstance(encoder, ColorEncoderV0x01)
+        assert encoder.actions() == [
+            {'action_type': 'output', 'port': 0xfffd}
+        ]
+    finally:
+        ENCODERS.pop('0x01')
+        get_encoder.cache_clear()
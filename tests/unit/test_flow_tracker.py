@@ -0,0 +1,99 @@
+"""Test flow_tracker.py."""
+from napps.amlight.coloring.flow_tracker import (CONFIRMED, FAILED, PENDING,
+                                                 QUEUED, FlowTracker)
+from tests.unit.helpers import FakeClock
+
+DPID = "00:00:00:00:00:00:00:01"
+
+
+def make_flow(value: str) -> dict:
+    """Build a coloring flow."""
+    return {"match": {"dl_src": value}, "table_id": 0}
+
+
+class TestFlowTracker:
+    """Test the FlowTracker class."""
+
+    def setup_method(self):
+        """Setup method."""
+        self.clock = FakeClock()
+        self.tracker = FlowTracker(10, 40, clock=self.clock)
+
+    def test_backoff(self):
+        """Test backoff is exponential and capped."""
+        assert [self.tracker.backoff(i) for i in range(1, 6)] == [
+            10, 20, 40, 40, 40
+        ]
+
+    def test_confirmed(self):
+        """Test confirmed flows are never due."""
+        flow = make_flow("ee:ee:ee:ee:ee:02")
+        self.tracker.sent(DPID, [flow])
+        assert self.tracker.pending()[0]["state"] == PENDING
+        assert self.tracker.confirmed(DPID, flow["match"])
+        self.clock.now = 1000
+        assert not self.tracker.due()
+        assert not self.tracker.pending()
+        assert not self.tracker.confirmed(DPID, {"dl_src": "unknown"})
+
+    def test_due(self):
+        """Test failed and unconfirmed flows are due after the backoff."""
+        flow1 = make_flow("ee:ee:ee:ee:ee:02")
+        flow2 = make_flow("ee:ee:ee:ee:ee:03")
+        flow3 = make_flow("ee:ee:ee:ee:ee:04")
+        self.tracker.sent(DPID, [flow1, flow2, flow3])
+        self.tracker.failed(DPID, flow1["match"])
+        self.tracker.confirmed(DPID, flow3["match"])
+        assert not self.tracker.due()
+
+        self.clock.now = 10
+        assert self.tracker.due() == {DPID: [flow1, flow2]}
+        states = {entry["match"]["dl_src"]: entry["state"]
+                  for entry in self.tracker.pending()}
+        assert states == {"ee:ee:ee:ee:ee:02": FAILED,
+                          "ee:ee:ee:ee:ee:03": PENDING}
+
+        # Retries back off exponentially
+        self.tracker.sent(DPID, [flow1])
+        entry = next(entry for entry in self.tracker.pending()
+                     if entry["match"] == flow1["match"])
+        assert entry["attempts"] == 2
+        assert entry["retry_in"] == 20
+        self.clock.now = 29
+        assert self.tracker.due() == {DPID: [flow2]}
+
+        # Confirmed flows sent again start over
+        self.tracker.sent(DPID, [flow3])
+        entry = next(entry for entry in self.tracker.pending()
+                     if entry["match"] == flow3["match"])
+        assert entry["attempts"] == 1
+        assert entry["state"] != CONFIRMED
+
+    def test_queued(self):
+        """Test queued flows aren't due until they're sent."""
+        flow = make_flow("ee:ee:ee:ee:ee:02")
+        self.tracker.sent(DPID, [flow])
+        self.clock.now = 10
+        assert self.tracker.due() == {DPID: [flow]}
+        self.tracker.queued(DPID, [flow])
+        self.clock.now = 1000
+        assert not self.tracker.due()
+        entry = self.tracker.pending()[0]
+        assert entry["state"] == QUEUED
+        assert entry["retry_in"] is None
+
+        self.tracker.sent(DPID, [flow])
+        entry = self.tracker.pending()[0]
+        assert entry["state"] == PENDING
+        assert entry["attempts"] == 2
+        assert entry["retry_in"] == 20
+
+    def test_forget(self):
+        """Test forget."""
+        flow = make_flow("ee:ee:ee:ee:ee:02")
+        self.tracker.sent(DPID, [flow])
+        self.tracker.forget(DPID, flow["match"])
+        self.tracker.forget(DPID, flow["match"])
+        self.clock.now = 1000
+        assert not self.tracker.due()
+        assert not self.tracker.pending()
@@ -0,0 +1,165 @@
+"""Test graph_coloring.py."""
+import random
+
+import pytest
+
+from napps.amlight.coloring.aggregation import (block_color_valid,
+                                                field_value, prefix_cover)
+from napps.amlight.coloring.graph_coloring import (block_coloring,
+                                                   distance2_coloring)
+from napps.amlight.coloring.utils import colors_to_field, mac_color_valid
+
+
+def assert_distance2(adjacency: dict, colors: dict) -> None:
+    """Assert that nodes up to 2 hops apart have different colors."""
+    assert set(colors) == set(adjacency)
+    for node, neighbors in adjacency.items():
+        closed = [colors[member] for member in [node, *neighbors]]
+        assert len(closed) == len(set(closed))
+
+
+def random_adjacency(seed: int, size: int) -> dict:
+    """Build a random undirected adjacency."""
+    rand = random.Random(seed)
+    nodes = [f"{index:04x}" for index in range(size)]
+    adjacency = {node: set() for node in nodes}
+    for _ in range(size * 2):
+        node_a, node_b = rand.sample(nodes, 2)
+        adjacency[node_a].add(node_b)
+        adjacency[node_b].add(node_a)
+    return adjacency
+
+
+def test_distance2_coloring_star() -> None:
+    """Test a star needs one color per node."""
+    adjacency = {"hub": {"a", "b", "c"}, "a": {"hub"}, "b": {"hub"},
+                 "c": {"hub"}}
+    colors = distance2_coloring(adjacency)
+    assert_distance2(adjacency, colors)
+    assert sorted(colors.values()) == [1, 2, 3, 4]
+
+
+def test_distance2_coloring_line() -> None:
+    """Test a line reuses colors 3 hops apart."""
+    nodes = [f"{index:02d}" for index in range(9)]
+    adjacency = {node: set() for node in nodes}
+    for node_a, node_b in zip(nodes, nodes[1:]):
+        adjacency[node_a].add(node_b)
+        adjacency[node_b].add(node_a)
+    colors = distance2_coloring(adjacency)
+    assert_distance2(adjacency, colors)
+    assert max(colors.values()) == 3
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_distance2_coloring_random(seed) -> None:
+    """Test random topologies and their incremental recoloring."""
+    adjacency = random_adjacency(seed, 300)
+    colors = distance2_coloring(adjacency)
+    assert_distance2(adjacency, colors)
+
+    # Unchanged topologies keep every color
+    assert distance2_coloring(adjacency, colors) == colors
+
+    # A new link only recolors a few nodes
+    rand = random.Random(seed)
+    node_a, node_b = rand.sample(sorted(adjacency), 2)
+    adjacency[node_a].add(node_b)
+    adjacency[node_b].add(node_a)
+    recolored = distance2_coloring(adjacency, colors)
+    assert_distance2(adjacency, recolored)
+    changed = [node for node in colors if colors[node] != recolored[node]]
+    assert len(changed) <= 2
+
+
+def test_distance2_coloring_previous() -> None:
+    """Test previous colors are kept, and conflicts or new nodes colored."""
+    adjacency = {"a": {"b"}, "b": {"a", "c"}, "c": {"b"}, "d": set()}
+    colors = distance2_coloring(adjacency, {"a": 7, "b": 8, "c": 7,
+                                            "gone": 1})
+    assert_distance2(adjacency, colors)
+    assert colors["a"] == 7
+    assert colors["b"] == 8
+    assert colors["c"] == 1
+    assert colors["d"] == 1
+
+
+def test_distance2_coloring_dl_src() -> None:
+    """Test more than 256 colors on dl_src give different MACs."""
+    adjacency = {"hub": {f"{index:04x}" for index in range(600)}}
+    for node in adjacency["hub"]:
+        adjacency[node] = {"hub"}
+    colors = distance2_coloring(adjacency, valid=mac_color_valid)
+    assert_distance2(adjacency, colors)
+    assert max(colors.values()) > 0x1ee
+    assert all(mac_color_valid(color) for color in colors.values())
+    macs = colors_to_field(list(colors.values()), "dl_src")
+    assert len(set(macs)) == len(macs)
+
+    # Invalid previous colors are replaced
+    previous = {"hub": 0xee, "0000": 0x1ee}
+    colors = distance2_coloring(adjacency, previous, valid=mac_color_valid)
+    assert colors["hub"] != 0xee and colors["0000"] != 0x1ee
+
+
+def test_block_coloring_star() -> None:
+    """Test the neighbors of a hub get one aligned block."""
+    adjacency = {"hub": {"a", "b", "c"}, "a": {"hub"}, "b": {"hub"},
+                 "c": {"hub"}}
+    colors = block_coloring(adjacency)
+    assert_distance2(adjacency, colors)
+    assert [colors[node] for node in "abc"] == [1, 2, 3]
+    assert colors["hub"] == 4
+
+    # More neighbors than a block holds take several blocks
+    colors = block_coloring(adjacency, max_block_bits=1)
+    assert [colors[node] for node in "abc"] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("field", ["dl_src", "nw_src"])
+@pytest.mark.parametrize("seed", range(5))
+def test_block_coloring_covers_neighbors(seed, field) -> None:
+    """Test the masked matches of each node match its neighbor colors and
+    no other color in use, and an unchanged topology keeps its colors."""
+    adjacency = random_adjacency(seed, 300)
+    valid = block_color_valid(field, 8)
+    colors = block_coloring(adjacency, valid=valid)
+    assert_distance2(adjacency, colors)
+    assert len(set(colors.values())) == len(colors)
+    assert all(valid is None or valid(color) for color in colors.values())
+    values = {node: field_value(color, field)
+              for node, color in colors.items()}
+    ordered = sorted(set(values.values()))
+    width = 48 if field == "dl_src" else 32
+    entries = 0
+    for node, neighbors in adjacency.items():
+        cover = prefix_cover({values[neighbor] for neighbor in neighbors},
+                             ordered, width, width - 8)
+        entries += len(cover)
+        for value in ordered:
+            matched = any(value >> (width - prefix_len)
+                          == entry >> (width - prefix_len)
+                          for entry, prefix_len in cover)
+            assert matched == any(values[neighbor] == value
+                                  for neighbor in neighbors)
+    assert entries < sum(len(neighbors) for neighbors in adjacency.values())
+
+    assert block_coloring(adjacency, colors, valid) == colors
+
+
+def test_block_coloring_previous() -> None:
+    """Test a new neighbor of a hub takes a free color of its block, and
+    colors conflicting with another block are replaced."""
+    adjacency = {"hub": {f"{index:02x}" for index in range(6)}}
+    for node in adjacency["hub"]:
+        adjacency[node] = {"hub"}
+    colors = block_coloring(adjacency)
+    adjacency["hub"].add("new")
+    adjacency["new"] = {"hub"}
+    recolored = block_coloring(adjacency, colors)
+    assert all(recolored[node] == color for node, color in colors.items())
+    assert recolored["new"] == 7
+
+    recolored = block_coloring(adjacency, {**colors, "hub": 1})
+    assert recolored["hub"] != 1
+    assert len(set(recolored.values())) == len(recolored)
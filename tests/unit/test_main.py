@@ -4,7 +4,9 @@ from kytos.lib.helpers import get_controller_mock, get_test_client
 
 from kytos.core.common import EntityStatus
 from kytos.core.events import KytosEvent
+from napps.amlight.coloring.color_table import ColorTable
 from napps.amlight.coloring.main import Main
+from tests.unit.helpers import make_switches
 
 
 async def test_on_table_enabled():
@@ -98,20 +100,6 @@ class TestMain:
         color = self.napp.color_to_field(300, 'does_not_exit')
         assert color == initial_color & 0xff
 
-    async def test_rest_settings(self):
-        """Test method return_settings."""
-        endpoint = f"{self.base_endpoint}/settings/"
-        response = await self.api_client.get(endpoint)
-        assert response.status_code == 200
-        json_response = response.json()
-
-        assert json_response['color_field'] == "dl_src"
-        assert json_response['coloring_interval'] == 10
-        flow_manager_url = "/api/kytos/flow_manager/v2/flows/"
-        assert flow_manager_url in json_response['flow_manager_url']
-        topology_url = json_response['topology_url']
-        assert topology_url.endswith("/api/kytos/topology/v3/links")
-
     # pylint: disable=too-many-statements
     def test_update_colors(self):
         """Test method update_colors."""
@@ -217,6 +205,105 @@ class TestMain:
         self.napp.update_colors(links2)
         put_mock.assert_not_called()
 
+    def test_handle_topology_updated(self):
+        """Test handle_topology_updated feeds the enabled link pairs."""
+        link1 = Mock()
+        link1.is_enabled.return_value = True
+        link1.endpoint_a.switch.dpid = '00:00:00:00:00:00:00:01'
+        link1.endpoint_b.switch.dpid = '00:00:00:00:00:00:00:02'
+        link2 = Mock()
+        link2.is_enabled.return_value = False
+        topology = Mock()
+        topology.links = {'1': link1, '2': link2}
+
+        pairs = []
+        self.napp.update_colors_from_pairs = Mock(side_effect=pairs.extend)
+        self.napp.handle_topology_updated(topology)
+        assert pairs == [('00:00:00:00:00:00:00:01',
+                          '00:00:00:00:00:00:00:02')]
+        link1.as_dict.assert_not_called()
+        link2.as_dict.assert_not_called()
+
+    # pylint: disable=protected-access
+    def test_record_events(self):
+        """Test the input events are recorded when a recorder is set."""
+        self.napp.handle_topology_updated = Mock()
+        self.napp.handle_link_disabled = Mock()
+        self.napp.handle_switch_disabled = Mock()
+        topology = Mock()
+        topology.links = {'1': 'link1'}
+        self.napp.controller.switches = {'00:01': 'switch1'}
+        event = KytosEvent(name='kytos/topology.updated',
+                           content={'topology': topology})
+        self.napp.topology_updated(event)
+        self.napp.handle_topology_updated.assert_called_with(topology)
+
+        self.napp._recorder = Mock()
+        self.napp.topology_updated(event)
+        self.napp._recorder.topology_updated.assert_called_with(['switch1'],
+                                                                ['link1'])
+        event = KytosEvent(name='kytos/topology.link.disabled',
+                           content={'link': 'link1'})
+        self.napp.on_link_disabled(event)
+        self.napp._recorder.link_disabled.assert_called_with('link1')
+        self.napp.handle_link_disabled.assert_called_with('link1')
+        event = KytosEvent(name='kytos/topology.switch.disabled',
+                           content={'dpid': '00:01'})
+        self.napp.on_switch_disabled(event)
+        self.napp._recorder.switch_disabled.assert_called_with('00:01')
+
+        self.napp.shutdown()
+        self.napp._recorder.close.assert_called_once()
+
+    def test_switch_status_listeners(self):
+        """Test the enabled, handshake completed and connection lost
+        listeners."""
+        self.napp.handle_switch_status = Mock()
+        self.napp.handle_switch_resync = Mock()
+        self.napp.handle_switch_down = Mock()
+        switch = Mock()
+        switch.dpid = '00:01'
+        self.napp.controller.get_switch_by_dpid.return_value = switch
+
+        self.napp.on_switch_enabled(KytosEvent(
+            name='kytos/topology.switch.enabled', content={'dpid': '00:01'}
+        ))
+        self.napp.handle_switch_status.assert_called_once_with(switch)
+        self.napp.handle_switch_resync.assert_not_called()
+
+        self.napp.on_handshake_completed(KytosEvent(
+            name='kytos/of_core.handshake.completed',
+            content={'switch': switch}
+        ))
+        assert self.napp.handle_switch_status.call_count == 2
+        self.napp.handle_switch_resync.assert_called_once_with('00:01')
+
+        self.napp.on_connection_lost(KytosEvent(
+            name='kytos/of_core.connection.lost',
+            content={'source': Mock(switch=switch)}
+        ))
+        self.napp.handle_switch_down.assert_called_once_with('00:01')
+
+    # pylint: disable=protected-access
+    def test_update_colors_batched_matches(self):
+        """Test the neighbor colors encoded in one batch match the scalar
+        color_to_field path."""
+        switches = make_switches(
+            4, lambda index: f'00:00:00:00:00:00:{index:02x}:{index:02x}'
+        )
+        dpids = list(switches)
+        self.napp.controller.switches = switches
+        for field in ('dl_src', 'nw_src', 'dl_vlan', 'nw_tos'):
+            self.napp._color_field = field
+            self.napp.switches = {}
+            self.napp.update_colors_from_pairs(zip(dpids, dpids[1:]))
+            for dpid, switch_dict in self.napp.switches.items():
+                encoder = self.napp._eligible[dpid]
+                for neighbor, flow in switch_dict['flows'].items():
+                    color = self.napp.switches[neighbor]['color']
+                    assert flow == self.napp._build_flow(dpid, color,
+                                                         encoder)
+
     def test_update_colors_without_links(self):
         """Test method update_colors without links."""
         switch1 = Mock()
@@ -252,30 +339,112 @@ class TestMain:
         assert sw2['color'] == 2
         assert sw2['flows'] == {}
 
-    async def test_rest_colors(self):
-        """ Test rest call to /colors to retrieve all switches color. """
-        switch1 = {'dpid': '00:00:00:00:00:00:00:01',
-                   'ofp_version': '0x04',
-                   'color': 300}
-        self.napp.switches = {'1': switch1}
+    def test_bootstrap(self):
+        """Test bootstrap colors the topology known at load time."""
+        self.napp.update_colors_from_pairs = Mock()
+        self.napp.controller.switches = {}
+        self.napp.bootstrap()
+        self.napp.update_colors_from_pairs.assert_not_called()
 
-        endpoint = f"{self.base_endpoint}/colors"
-        response = await self.api_client.get(endpoint)
-        assert response.status_code == 200
-
-        json_response = response.json()
-        assert json_response['colors']['1']['color_field'] == 'dl_src'
-        color_value = json_response['colors']['1']['color_value']
-        assert color_value == 'ee:ee:ee:ee:01:2c'
+        switch1 = Mock()
+        switch1.dpid = '00:00:00:00:00:00:00:01'
+        switch2 = Mock()
+        switch2.dpid = '00:00:00:00:00:00:00:02'
+        link = Mock()
+        link.is_enabled.return_value = True
+        link.endpoint_a.switch = switch1
+        link.endpoint_b.switch = switch2
+        self.napp.controller.switches = {switch1.dpid: switch1,
+                                         switch2.dpid: switch2}
+        self.napp.controller.links = {'1': link}
+        self.napp.bootstrap()
+        pairs = list(self.napp.update_colors_from_pairs.call_args[0][0])
+        assert pairs == [(switch1.dpid, switch2.dpid)]
+
+        # Without controller.links, the topology NApp links are read
+        del self.napp.controller.links
+        topology = Mock()
+        topology.links = {}
+        self.napp.controller.napps = {('kytos', 'topology'): topology}
+        self.napp.bootstrap()
+        assert not list(self.napp.update_colors_from_pairs.call_args[0][0])
+
+    def test_setup_bootstrap(self):
+        """Test a reloaded NApp installs the flows at load time."""
+        controller = get_controller_mock()
+        switches = make_switches(2)
+        link = Mock()
+        link.is_enabled.return_value = True
+        link.endpoint_a.switch = switches['00:00:00:00:00:00:00:01']
+        link.endpoint_b.switch = switches['00:00:00:00:00:00:00:02']
+        controller.switches = switches
+        controller.links = {'1': link}
+        controller.buffers.app.put = Mock()
+
+        napp = Main(controller)
+        assert napp.switches['00:00:00:00:00:00:00:01']['neighbors'] == {
+            '00:00:00:00:00:00:00:02'
+        }
+        installs = [call[0][0] for call in
+                    controller.buffers.app.put.call_args_list]
+        assert len(installs) == 2
+        assert all(event.name == 'kytos.flow_manager.flows.single.install'
+                   for event in installs)
 
-    async def test_rest_colors_without_switches(self):
-        """ Test rest call to /colors without switches. """
-        self.napp.switches = {}
+    # pylint: disable=protected-access
+    def test_publish_color_table(self, tmp_path):
+        """Test the color table round-trips against _switch_colors."""
+        dpid1 = '00:00:00:00:00:00:00:01'
+        dpid2 = '00:00:00:00:00:00:01:2c'
+        self.napp._publish_color_table()
+        assert not list(tmp_path.iterdir())
 
-        endpoint = f"{self.base_endpoint}/colors"
-        response = await self.api_client.get(endpoint)
-        assert response.status_code == 200
-        assert response.json()['colors'] == {}
+        path = str(tmp_path / 'colors.bin')
+        self.napp._color_table_path = path
+        self.napp.switches = {
+            dpid2: {'color': 300, 'neighbors': {dpid1}, 'flows': {}},
+            dpid1: {'color': 1, 'neighbors': {dpid2}, 'flows': {}},
+        }
+        self.napp._publish_color_table()
+        with ColorTable(path) as table:
+            assert table.generation == 1
+            assert table.colors() == self.napp._switch_colors()
+            assert table.find(dpid2).degree == 1
+
+        self.napp._publish_color_table()
+        with ColorTable(path) as table:
+            assert table.generation == 1
+
+        self.napp.switches[dpid2]['neighbors'] = set()
+        self.napp.switches[dpid1]['neighbors'] = set()
+        self.napp.handle_switch_disabled(dpid2)
+        with ColorTable(path) as table:
+            assert table.generation == 2
+            assert table.colors() == self.napp._switch_colors()
+            assert len(table) == 1
+
+        # A reloaded NApp goes on from the generation of the table
+        with patch('napps.amlight.coloring.main.settings.COLOR_TABLE_PATH',
+                   path):
+            napp = Main(get_controller_mock())
+        napp.switches = {dpid1: {'color': 1, 'neighbors': set(),
+                                 'flows': {}}}
+        napp._publish_color_table()
+        with ColorTable(path) as table:
+            assert table.generation == 3
+
+        # The snapshot is taken under the color table lock, so concurrent
+        # handlers write their tables in the order of their snapshots
+        locked = []
+        napp._switches_lock = MagicMock()
+        napp._switches_lock.__enter__.side_effect = lambda: locked.append(
+            napp._color_table_lock.locked()
+        )
+        napp.switches[dpid1]['color'] = 2
+        napp._publish_color_table()
+        assert locked == [True]
+        with ColorTable(path) as table:
+            assert table.generation == 4
 
     def test_get_cookie(self) -> None:
         """test get_cookie."""
@@ -353,26 +522,10 @@ class TestMain:
         self.napp.handle_link_disabled(link)
         assert mock_send_flow.call_count == 1
 
-    # pylint: disable=protected-access
-    def test_send_flow_mods(self):
-        """Test _send_flow_mods"""
-        flows = {
-            "00:01": [{
-                'match': {'dl_src': 'ee:ee:ee:ee:ee:02'},
-                'table_id': 0
-            }]
-        }
-        self.napp._send_flow_mods(flows, "delete")
-        args = self.napp.controller.buffers.app.put.call_args[0][0]
-        assert args.name == "kytos.flow_manager.flows.single.delete"
-        assert args.content['flow_dict']['flows'] == flows['00:01']
-        assert self.napp.controller.buffers.app.put.call_count == 1
-
-        self.napp._send_flow_mods(flows, "install")
-        args = self.napp.controller.buffers.app.put.call_args[0][0]
-        assert args.name == "kytos.flow_manager.flows.single.install"
-        assert args.content['flow_dict']['flows'] == flows['00:01']
-        assert self.napp.controller.buffers.app.put.call_count == 2
+        # Flows already deleted as stale flows
+        link.endpoint_b.switch.dpid = '00:00:00:00:00:00:00:02'
+        self.napp.handle_link_disabled(link)
+        assert mock_send_flow.call_count == 1
 
     def test_update_switches_table(self):
         """Test update_switches_table"""
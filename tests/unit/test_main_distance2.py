@@ -0,0 +1,231 @@
+"""Test the distance-2 coloring of the Main class."""
+import random
+from collections import defaultdict
+from unittest.mock import Mock, patch
+from kytos.lib.helpers import get_controller_mock
+
+from napps.amlight.coloring.main import Main
+from tests.unit.helpers import make_switches
+
+
+class TestMainDistance2:
+    """Test the distance-2 coloring and masked matches of the Main
+    class."""
+
+    def setup_method(self):
+        """Setup method."""
+        controller = get_controller_mock()
+        self.napp = Main(controller)
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_update_colors_distance2(self, mock_send_flow):
+        """Test update_colors on distance2 coloring mode."""
+        self.napp._coloring_mode = 'distance2'
+        self.napp._color_field = 'nw_tos'
+        switches = make_switches(
+            4, lambda index: f'00:00:00:00:00:00:01:{index:02x}'
+        )
+        dpid1, dpid2, dpid3, dpid4 = switches
+        self.napp.controller.switches = switches
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3)])
+        colors = {dpid: switch_dict['color']
+                  for dpid, switch_dict in self.napp.switches.items()}
+        assert colors == {dpid1: 2, dpid2: 1, dpid3: 3, dpid4: 1}
+        match = self.napp.switches[dpid2]['flows'][dpid3]['match']
+        assert match == {'nw_tos': 3}
+
+        # 4 is now 2 hops away from 2, so it gets a new color
+        mock_send_flow.reset_mock()
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3),
+                                            (dpid3, dpid4)])
+        assert self.napp.switches[dpid4]['color'] == 2
+        assert self.napp.switches[dpid2]['color'] == 1
+        (installed, action), _ = mock_send_flow.call_args
+        assert action == "install"
+        assert installed[dpid3][0]['match'] == {'nw_tos': 2}
+
+        # 4 is now adjacent to 1, the flow of 3 matching the previous color
+        # of 4 is deleted and installed again
+        mock_send_flow.reset_mock()
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3),
+                                            (dpid3, dpid4), (dpid1, dpid4)])
+        colors = {dpid: switch_dict['color']
+                  for dpid, switch_dict in self.napp.switches.items()}
+        assert colors == {dpid1: 2, dpid2: 1, dpid3: 3, dpid4: 4}
+        (deleted, action), _ = mock_send_flow.call_args_list[0]
+        assert action == "delete"
+        assert deleted[dpid3][0]['match'] == {'nw_tos': 2}
+        (installed, action), _ = mock_send_flow.call_args_list[1]
+        assert action == "install"
+        assert {'nw_tos': 4} in [flow['match'] for flow in installed[dpid3]]
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_distance2_seeded_colors(self, mock_send_flow, tmp_path):
+        """Test a reloaded NApp starting from the colors of the color
+        table."""
+        path = str(tmp_path / 'colors.bin')
+        switches = make_switches(4)
+        dpid1, dpid2, dpid3, dpid4 = switches
+        self.napp._color_table_path = path
+        self.napp.switches = {
+            dpid1: {'color': 1, 'neighbors': set(), 'flows': {}},
+            dpid2: {'color': 1, 'neighbors': set(), 'flows': {}},
+            dpid3: {'color': 5, 'neighbors': set(), 'flows': {}},
+            dpid4: {'color': 6, 'neighbors': set(), 'flows': {}},
+        }
+        self.napp._publish_color_table()
+
+        with patch.multiple('napps.amlight.coloring.main.settings',
+                            COLOR_TABLE_PATH=path,
+                            COLORING_MODE='distance2'):
+            napp = Main(get_controller_mock())
+        napp.controller.switches = switches
+        napp.update_colors_from_pairs([(dpid1, dpid3), (dpid2, dpid3),
+                                       (dpid2, dpid4)])
+        colors = {dpid: switch_dict['color']
+                  for dpid, switch_dict in napp.switches.items()}
+        assert colors == {dpid1: 1, dpid2: 2, dpid3: 5, dpid4: 6}
+        assert not napp._seed_colors
+
+        # 4 had a flow matching the previous color of 2, which 3 still
+        # needs for 1
+        (deleted, action), _ = mock_send_flow.call_args_list[0]
+        assert action == "delete"
+        assert deleted == {dpid4: [{
+            'table_id': 0, 'owner': 'coloring',
+            'match': {'dl_src': napp.color_to_field(1)}
+        }]}
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.settings')
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_update_colors_masked_matches(self, mock_send_flow,
+                                          mock_settings):
+        """Test update_colors covering neighbors with masked matches."""
+        mock_settings.STALE_FLOWS_MAX_PER_UPDATE = 1000
+        mock_settings.MASKED_MATCHES_MAX_WILDCARD_BITS = 8
+        mock_settings.MASKED_MATCHES_DELETE_TIMEOUT = 10
+        mock_settings.COOKIE_PREFIX = 0xAC
+        self.napp._coloring_mode = 'distance2'
+        self.napp._masked_matches = True
+        switches = make_switches(5)
+        dpid1, dpid2, dpid3, dpid4, dpid5 = switches
+        self.napp.controller.switches = switches
+
+        # The neighbors of 1 get a block of colors that one mask covers
+        self.napp.update_colors_from_pairs(
+            [(dpid1, dpid4), (dpid1, dpid5), (dpid2, dpid3)]
+        )
+        assert self.napp.switches[dpid4]['color'] == 1
+        assert self.napp.switches[dpid5]['color'] == 2
+        sw1 = self.napp.switches[dpid1]
+        assert not sw1['flows']
+        match = 'ee:ee:ee:ee:ee:00/ff:ff:ff:ff:ff:fc'
+        assert list(sw1['masked_flows']) == [match]
+        assert sw1['masked_flows'][match]['match'] == {'dl_src': match}
+        # Switches with a single neighbor keep the exact match
+        assert list(self.napp.switches[dpid2]['flows']) == [dpid3]
+        assert self.napp._aggregation_report() == {
+            dpid1: {'neighbors': 2, 'entries': 1, 'saved': 1},
+            dpid2: {'neighbors': 1, 'entries': 1, 'saved': 0},
+            dpid3: {'neighbors': 1, 'entries': 1, 'saved': 0},
+            dpid4: {'neighbors': 1, 'entries': 1, 'saved': 0},
+            dpid5: {'neighbors': 1, 'entries': 1, 'saved': 0},
+        }
+
+        # 2 and 4 are now neighbors of 1 in different blocks, so exact
+        # matches are back, installed once the masked flow is removed
+        mock_send_flow.reset_mock()
+        self.napp.update_colors_from_pairs(
+            [(dpid1, dpid2), (dpid1, dpid4), (dpid2, dpid3), (dpid2, dpid4)]
+        )
+        assert not sw1['masked_flows']
+        assert sorted(sw1['flows']) == [dpid2, dpid4]
+        (deleted, action), _ = mock_send_flow.call_args_list[0]
+        assert action == "delete"
+        assert deleted[dpid1] == [{
+            'table_id': 0, 'owner': 'coloring', 'match': {'dl_src': match}
+        }]
+        (installed, action), _ = mock_send_flow.call_args_list[1]
+        assert action == "install"
+        assert dpid1 not in installed
+
+        mock_send_flow.reset_mock()
+        flow = Mock(cookie=0xAC << 56)
+        flow.as_dict.return_value = {'match': {'dl_src': match}}
+        self.napp._handle_flow_removed(dpid1, flow)
+        mock_send_flow.assert_called_once()
+        (installed, action), _ = mock_send_flow.call_args
+        assert action == "install"
+        assert sorted(flow['match']['dl_src'] for flow in installed[dpid1]) \
+            == [self.napp.color_to_field(sw['color'])
+                for sw in (self.napp.switches[dpid4],
+                           self.napp.switches[dpid2])]
+        assert not self.napp._held_flows
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.settings')
+    def test_masked_matches_requires_distance2(self, mock_settings):
+        """Test MASKED_MATCHES is ignored on the dpid coloring mode."""
+        mock_settings.MASKED_MATCHES = True
+        mock_settings.COLOR_FIELD = 'dl_src'
+        mock_settings.COLORING_MODE = 'dpid'
+        mock_settings.EVENT_RECORD_PATH = None
+        assert not Main(get_controller_mock())._masked_matches
+        mock_settings.COLORING_MODE = 'distance2'
+        assert Main(get_controller_mock())._masked_matches
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.settings')
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_held_flows_timeout(self, mock_send_flow, mock_settings):
+        """Test held installs are sent when the deletion of the masked
+        flows isn't reported in time."""
+        mock_settings.MASKED_MATCHES_DELETE_TIMEOUT = 10
+        dpid = '00:00:00:00:00:00:00:01'
+        flow = {'match': {'dl_src': 'ee:ee:ee:ee:ee:01'}}
+        self.napp.switches[dpid] = {'color': 1, 'neighbors': set(),
+                                    'flows': {'00:02': flow}}
+        masked = {'match': {'dl_src': 'ee:ee:ee:ee:ee:00/ff:ff:ff:ff:ff:fc'},
+                  'table_id': 0}
+        self.napp._delete_masked_flow(dpid, masked, defaultdict(list))
+        installs = {dpid: [flow]}
+        self.napp._hold_flows(installs)
+        assert not installs
+
+        self.napp._release_held_flows()
+        mock_send_flow.assert_not_called()
+        self.napp._held_flows[dpid]['deadline'] = 0.0
+        self.napp._release_held_flows()
+        mock_send_flow.assert_called_once_with({dpid: [flow]}, "install")
+        assert not self.napp._held_flows
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.settings')
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_masked_matches_leaf_spine(self, _, mock_settings):
+        """Test the spines of a leaf-spine fabric with non sequential dpids
+        cover their leaves with a single masked match."""
+        mock_settings.STALE_FLOWS_MAX_PER_UPDATE = 1000
+        mock_settings.MASKED_MATCHES_MAX_WILDCARD_BITS = 8
+        self.napp._coloring_mode = 'distance2'
+        self.napp._masked_matches = True
+        rand = random.Random(0)
+        switches = make_switches(
+            104, lambda _: rand.getrandbits(64).to_bytes(8, 'big').hex(':')
+        )
+        dpids = list(switches)
+        spines, leaves = dpids[:4], dpids[4:]
+        self.napp.controller.switches = switches
+        self.napp.update_colors_from_pairs(
+            [(spine, leaf) for spine in spines for leaf in leaves]
+        )
+        report = self.napp._aggregation_report()
+        for spine in spines:
+            assert report[spine] == {'neighbors': 100, 'entries': 1,
+                                     'saved': 99}
+        for leaf in leaves:
+            assert report[leaf] == {'neighbors': 4, 'entries': 1,
+                                    'saved': 3}
@@ -0,0 +1,339 @@
+"""Test the flow mods sent by the Main class."""
+from unittest.mock import Mock, patch
+from kytos.lib.helpers import get_controller_mock
+
+from kytos.core.common import EntityStatus
+from napps.amlight.coloring.flow_tracker import FlowTracker
+from napps.amlight.coloring.main import Main
+from napps.amlight.coloring.rate_limiter import FlowModRateLimiter
+from tests.unit.helpers import FakeClock, make_switches
+
+
+class TestMainFlows:
+    """Test the flow mods sent by the Main class."""
+
+    def setup_method(self):
+        """Setup method."""
+        controller = get_controller_mock()
+        self.napp = Main(controller)
+
+    def test_update_colors_mixed_versions(self):
+        """Test method update_colors on a mixed-version fabric."""
+        switches = make_switches(3)
+        for switch, version in zip(switches.values(),
+                                   ['0x04', '0x06', '0x01']):
+            switch.ofp_version = version
+
+        self.napp.controller.switches = switches
+        self.napp.controller.get_switch_by_dpid = \
+            Mock(side_effect=switches.get)
+
+        dpid1, dpid2, dpid3 = switches
+        links = [
+            {
+                'endpoint_a': {'switch': dpid1},
+                'endpoint_b': {'switch': dpid2},
+                'enabled': True
+            },
+            {
+                'endpoint_a': {'switch': dpid2},
+                'endpoint_b': {'switch': dpid3},
+                'enabled': True
+            }
+        ]
+        self.napp.update_colors(links)
+
+        sw1 = self.napp.switches[dpid1]
+        sw2 = self.napp.switches[dpid2]
+        sw3 = self.napp.switches[dpid3]
+        assert list(sw1['flows']) == [dpid2]
+        assert sorted(sw2['flows']) == [dpid1, dpid3]
+        assert not sw3['flows']
+        for flow in [sw1['flows'][dpid2], *sw2['flows'].values()]:
+            assert flow['actions'] == [
+                {'action_type': 'output', 'port': 0xfffffffd}
+            ]
+        match = sw2['flows'][dpid3]['match']
+        assert match == {'dl_src': 'ee:ee:ee:ee:ee:03'}
+        assert self.napp.controller.buffers.app.put.call_count == 2
+
+    # pylint: disable=protected-access
+    def test_handle_switch_status(self):
+        """Test handle_switch_status and handle_switch_down."""
+        switch = Mock()
+        switch.dpid = '00:00:00:00:00:00:00:01'
+        switch.ofp_version = '0x04'
+        switch.status = EntityStatus.UP
+        switch.is_enabled = lambda: True
+        self.napp.handle_switch_status(switch)
+        assert switch.dpid in self.napp._eligible
+
+        switch.ofp_version = '0x01'
+        self.napp.handle_switch_status(switch)
+        assert switch.dpid not in self.napp._eligible
+
+        switch.ofp_version = '0x04'
+        self.napp.handle_switch_status(switch)
+        self.napp.handle_switch_down(switch.dpid)
+        assert switch.dpid not in self.napp._eligible
+
+        switch.status = EntityStatus.DOWN
+        self.napp.handle_switch_status(switch)
+        assert switch.dpid not in self.napp._eligible
+
+    def test_update_colors_eligible_switches(self):
+        """Test update_colors only generates flows for eligible switches,
+        without looking them up by dpid."""
+        switches = make_switches(3)
+        dpid1, dpid2, dpid3 = switches
+        switches[dpid3].status = EntityStatus.DOWN
+        self.napp.controller.switches = switches
+
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3)])
+        self.napp.controller.get_switch_by_dpid.assert_not_called()
+        assert sorted(self.napp.switches[dpid2]['flows']) == [dpid1, dpid3]
+        assert not self.napp.switches[dpid3]['flows']
+
+        # The switch comes back UP through a status event
+        switches[dpid3].status = EntityStatus.UP
+        self.napp.handle_switch_status(switches[dpid3])
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3)])
+        assert list(self.napp.switches[dpid3]['flows']) == [dpid2]
+
+    @patch('napps.amlight.coloring.main.settings')
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_update_colors_stale_flows(self, mock_send_flow, mock_settings):
+        """Test update_colors deletes the flows of gone neighbors, bounded
+        per update."""
+        mock_settings.STALE_FLOWS_MAX_PER_UPDATE = 1
+        mock_settings.MASKED_MATCHES = False
+        switches = make_switches(3)
+        dpid1, dpid2, dpid3 = switches
+        self.napp.controller.switches = switches
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3)])
+        assert sorted(self.napp.switches[dpid2]['flows']) == [dpid1, dpid3]
+
+        # The link between 2 and 3 is gone without a link disabled event
+        mock_send_flow.reset_mock()
+        self.napp.update_colors_from_pairs([(dpid1, dpid2)])
+        flows, action = mock_send_flow.call_args_list[0][0]
+        assert action == "delete"
+        assert sum(len(mods) for mods in flows.values()) == 1
+        flows_left = (len(self.napp.switches[dpid2]['flows'])
+                      + len(self.napp.switches[dpid3]['flows']))
+        assert flows_left == 2
+
+        mock_send_flow.reset_mock()
+        self.napp.update_colors_from_pairs([(dpid1, dpid2)])
+        flows, action = mock_send_flow.call_args_list[0][0]
+        assert action == "delete"
+        assert list(self.napp.switches[dpid2]['flows']) == [dpid1]
+        assert not self.napp.switches[dpid3]['flows']
+
+        # Nothing left to delete
+        mock_send_flow.reset_mock()
+        self.napp.update_colors_from_pairs([(dpid1, dpid2)])
+        assert [call[0][1] for call in mock_send_flow.call_args_list] == [
+            "install"
+        ]
+
+    @patch('napps.amlight.coloring.main.Main._send_flow_mods')
+    def test_handle_switch_resync(self, mock_send_flow):
+        """Test handle_switch_resync reinstalls only the switch flows."""
+        switches = make_switches(3)
+        dpid1, dpid2, dpid3 = switches
+        self.napp.controller.switches = switches
+        self.napp.update_colors_from_pairs([(dpid1, dpid2), (dpid2, dpid3)])
+        mock_send_flow.reset_mock()
+
+        self.napp.handle_switch_resync(dpid2)
+        mock_send_flow.assert_called_once()
+        flows, action = mock_send_flow.call_args[0]
+        assert action == "install"
+        assert list(flows) == [dpid2]
+        matches = sorted(flow['match']['dl_src'] for flow in flows[dpid2])
+        assert matches == ['ee:ee:ee:ee:ee:01', 'ee:ee:ee:ee:ee:03']
+
+        # Unknown and not eligible switches are skipped
+        self.napp.handle_switch_resync('00:00:00:00:00:00:00:09')
+        self.napp.handle_switch_down(dpid2)
+        self.napp.handle_switch_resync(dpid2)
+        mock_send_flow.assert_called_once()
+
+    # pylint: disable=protected-access
+    def test_handle_flow_result(self):
+        """Test handle_flow_result."""
+        dpid = '00:00:00:00:00:00:00:01'
+        match = {'dl_src': 'ee:ee:ee:ee:ee:02'}
+        self.napp._flow_tracker.sent(dpid, [{'match': match}])
+        flow = Mock()
+        flow.cookie = self.napp.get_cookie(dpid)
+        flow.as_dict.return_value = {'match': match}
+
+        self.napp.handle_flow_result(dpid, flow, failed=True)
+        assert self.napp._flow_tracker.pending()[0]['state'] == 'failed'
+        self.napp.handle_flow_result(dpid, flow, failed=False)
+        assert not self.napp._flow_tracker.pending()
+
+        # Flows of other NApps are ignored
+        self.napp._flow_tracker.sent(dpid, [{'match': match}])
+        flow.cookie = 0xaa00000000000001
+        self.napp.handle_flow_result(dpid, flow, failed=False)
+        assert self.napp._flow_tracker.pending()[0]['state'] == 'pending'
+
+    # pylint: disable=protected-access
+    def test_flow_confirmed_during_put(self):
+        """Test a flow confirmed as soon as it's put stays confirmed."""
+        dpid = '00:00:00:00:00:00:00:01'
+        match = {'dl_src': 'ee:ee:ee:ee:ee:02'}
+        flow = Mock()
+        flow.cookie = self.napp.get_cookie(dpid)
+        flow.as_dict.return_value = {'match': match}
+        self.napp.controller.buffers.app.put = Mock(
+            side_effect=lambda event: self.napp.handle_flow_result(
+                dpid, flow, failed=False
+            )
+        )
+        self.napp._put_flow_mods({dpid: [{'match': match}]}, "install",
+                                 True)
+        assert not self.napp._flow_tracker.pending()
+        assert not self.napp._flow_tracker.due()
+
+    # pylint: disable=protected-access
+    def test_retry_flow_mods(self):
+        """Test retry_flow_mods resends only the due flows."""
+        self.napp.retry_flow_mods()
+        put_mock = self.napp.controller.buffers.app.put
+        put_mock.assert_not_called()
+
+        flows = {'00:01': [{'match': {'dl_src': 'ee:ee:ee:ee:ee:02'}}]}
+        self.napp._flow_tracker = Mock()
+        self.napp._flow_tracker.due.return_value = flows
+        self.napp.retry_flow_mods()
+        args = put_mock.call_args[0][0]
+        assert args.name == "kytos.flow_manager.flows.single.install"
+        assert args.content['flow_dict']['flows'] == flows['00:01']
+        self.napp._flow_tracker.sent.assert_called_with(
+            '00:01', flows['00:01']
+        )
+
+    # pylint: disable=protected-access
+    def test_send_flow_mods(self):
+        """Test _send_flow_mods"""
+        flows = {
+            "00:01": [{
+                'match': {'dl_src': 'ee:ee:ee:ee:ee:02'},
+                'table_id': 0
+            }]
+        }
+        self.napp._flow_tracker = Mock()
+        self.napp._send_flow_mods(flows, "delete")
+        self.napp._flow_tracker.forget.assert_called_once_with(
+            "00:01", flows['00:01'][0]['match']
+        )
+        args = self.napp.controller.buffers.app.put.call_args[0][0]
+        assert args.name == "kytos.flow_manager.flows.single.delete"
+        assert args.content['flow_dict']['flows'] == flows['00:01']
+        assert self.napp.controller.buffers.app.put.call_count == 1
+
+        self.napp._send_flow_mods(flows, "install")
+        self.napp._flow_tracker.sent.assert_called_once_with(
+            "00:01", flows['00:01']
+        )
+        args = self.napp.controller.buffers.app.put.call_args[0][0]
+        assert args.name == "kytos.flow_manager.flows.single.install"
+        assert args.content['flow_dict']['flows'] == flows['00:01']
+        assert self.napp.controller.buffers.app.put.call_count == 2
+
+    # pylint: disable=protected-access
+    @patch('napps.amlight.coloring.main.settings')
+    def test_flow_mod_rate(self, mock_settings):
+        """Test _flow_mod_rate precedence."""
+        mock_settings.FLOW_MOD_RATE_BY_DPID = {'00:01': (1, 1)}
+        mock_settings.FLOW_MOD_RATE_BY_OFP_VERSION = {'0x04': (2, 2)}
+        mock_settings.FLOW_MOD_RATE_DEFAULT = None
+        encoder = Mock()
+        encoder.ofp_version = '0x04'
+        self.napp._eligible = {'00:01': encoder, '00:02': encoder}
+        assert self.napp._flow_mod_rate('00:01') == (1, 1)
+        assert self.napp._flow_mod_rate('00:02') == (2, 2)
+        assert self.napp._flow_mod_rate('00:03') is None
+        mock_settings.FLOW_MOD_RATE_DEFAULT = (3, 3)
+        assert self.napp._flow_mod_rate('00:03') == (3, 3)
+
+    # pylint: disable=protected-access
+    def test_send_flow_mods_rate_limited(self):
+        """Test _send_flow_mods queues flow mods of rate limited switches
+        and execute releases them."""
+        flows = {
+            "00:01": [{'match': {'dl_src': f'ee:ee:ee:ee:ee:0{i}'},
+                       'table_id': 0} for i in range(1, 4)],
+            "00:02": [{'match': {'dl_src': 'ee:ee:ee:ee:ee:05'},
+                       'table_id': 0}],
+        }
+        clock = Mock(return_value=0)
+        self.napp._rate_limiter = FlowModRateLimiter(clock=clock)
+        self.napp._flow_mod_rate = Mock(
+            side_effect=lambda dpid: (1, 2) if dpid == "00:01" else None
+        )
+        put_mock = self.napp.controller.buffers.app.put
+        self.napp._send_flow_mods(flows, "install")
+        sent = {event.content['dpid']: event.content['flow_dict']['flows']
+                for event in (call[0][0] for call in put_mock.call_args_list)}
+        assert sent == {"00:01": flows["00:01"][:2],
+                        "00:02": flows["00:02"]}
+        assert self.napp._rate_limiter.status()['queue'] == 1
+
+        put_mock.reset_mock()
+        clock.return_value = 1
+        self.napp.execute()
+        args = put_mock.call_args[0][0]
+        assert args.content['dpid'] == "00:01"
+        assert args.content['flow_dict']['flows'] == flows["00:01"][2:]
+        assert self.napp._rate_limiter.status()['queue'] == 0
+
+    # pylint: disable=protected-access
+    def test_retry_rate_limited_flows(self):
+        """Test flows waiting in the rate limiter aren't queued again by
+        the retries."""
+        clock = FakeClock()
+        self.napp._rate_limiter = FlowModRateLimiter(clock=clock)
+        self.napp._flow_tracker = FlowTracker(10, 600, clock=clock)
+        self.napp._flow_mod_rate = Mock(return_value=(0.1, 1))
+        flows = {"00:01": [{'match': {'dl_src': f'ee:ee:ee:ee:{i:02x}:01'},
+                            'table_id': 0} for i in range(20)]}
+        self.napp._send_flow_mods(flows, "install")
+        for _ in range(40):
+            clock.now += 5
+            self.napp._dispatch_flow_mods()
+            self.napp.retry_flow_mods()
+            assert self.napp._rate_limiter.status()['queue'] <= 20
+
+    # pylint: disable=protected-access
+    def test_retry_behind_queued_delete(self):
+        """Test a flow whose delete waits in the rate limiter isn't
+        installed again by the retries."""
+        clock = FakeClock()
+        self.napp._rate_limiter = FlowModRateLimiter(clock=clock)
+        self.napp._flow_tracker = FlowTracker(10, 600, clock=clock)
+        self.napp._flow_mod_rate = Mock(return_value=(0.01, 1))
+        switches = make_switches(2)
+        dpid1, dpid2 = switches
+        self.napp.controller.switches = switches
+        self.napp.update_colors_from_pairs([(dpid1, dpid2)])
+
+        # The link is gone, its flows are deleted by the stale flows
+        # collection while they're still pending
+        self.napp.update_colors_from_pairs([])
+        clock.now += 20
+        self.napp.retry_flow_mods()
+        for _ in range(4):
+            clock.now += 100
+            self.napp._dispatch_flow_mods()
+
+        put_mock = self.napp.controller.buffers.app.put
+        actions = [call[0][0].name.rsplit('.', 1)[1]
+                   for call in put_mock.call_args_list]
+        assert actions == ['install', 'install', 'delete', 'delete']
+        assert not self.napp._flow_tracker.pending()
+        assert not self.napp.switches[dpid1]['flows']
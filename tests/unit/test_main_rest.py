@@ -0,0 +1,203 @@
+"""Test the REST endpoints of the Main class."""
+import json
+from unittest.mock import patch
+from kytos.lib.helpers import get_controller_mock, get_test_client
+
+from napps.amlight.coloring.main import Main
+
+
+class TestMainRest:
+    """Test the REST endpoints of the Main class."""
+
+    def setup_method(self):
+        """Setup method."""
+        controller = get_controller_mock()
+        self.napp = Main(controller)
+        self.api_client = get_test_client(controller, self.napp)
+        self.base_endpoint = "amlight/coloring"
+
+    async def test_rest_settings(self):
+        """Test method return_settings."""
+        endpoint = f"{self.base_endpoint}/settings/"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        json_response = response.json()
+
+        assert json_response['color_field'] == "dl_src"
+        assert json_response['coloring_interval'] == 10
+        flow_manager_url = "/api/kytos/flow_manager/v2/flows/"
+        assert flow_manager_url in json_response['flow_manager_url']
+        topology_url = json_response['topology_url']
+        assert topology_url.endswith("/api/kytos/topology/v3/links")
+
+    async def test_rest_colors(self):
+        """ Test rest call to /colors to retrieve all switches color. """
+        switch1 = {'dpid': '00:00:00:00:00:00:00:01',
+                   'ofp_version': '0x04',
+                   'color': 300}
+        self.napp.switches = {'1': switch1}
+
+        endpoint = f"{self.base_endpoint}/colors"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+
+        json_response = response.json()
+        assert json_response['colors']['1']['color_field'] == 'dl_src'
+        color_value = json_response['colors']['1']['color_value']
+        assert color_value == 'ee:ee:ee:ee:01:2c'
+
+    async def test_rest_colors_without_switches(self):
+        """ Test rest call to /colors without switches. """
+        self.napp.switches = {}
+
+        endpoint = f"{self.base_endpoint}/colors"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert response.json()['colors'] == {}
+
+    async def test_rest_colors_filtered_paginated(self):
+        """ Test rest call to /colors with dpids filter and pagination. """
+        self.napp.switches = {f'00:0{index}': {'color': index}
+                              for index in range(1, 6)}
+        endpoint = f"{self.base_endpoint}/colors?dpids=00:01,00:03,00:09"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert sorted(response.json()['colors']) == ['00:01', '00:03']
+
+        endpoint = f"{self.base_endpoint}/colors?limit=2"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        json_response = response.json()
+        assert sorted(json_response['colors']) == ['00:01', '00:02']
+        assert json_response['next_cursor'] == '00:02'
+
+        endpoint = f"{self.base_endpoint}/colors?limit=3&cursor=00:02"
+        response = await self.api_client.get(endpoint)
+        json_response = response.json()
+        assert sorted(json_response['colors']) == ['00:03', '00:04', '00:05']
+        assert json_response['next_cursor'] is None
+
+        endpoint = f"{self.base_endpoint}/colors?limit=0"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 400
+        endpoint = f"{self.base_endpoint}/colors?limit=a"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 400
+
+    async def test_rest_colors_ndjson(self):
+        """ Test rest call to /colors streaming NDJSON. """
+        self.napp.switches = {f'00:0{index}': {'color': index}
+                              for index in range(1, 4)}
+        endpoint = f"{self.base_endpoint}/colors?format=ndjson&limit=2"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert response.headers['x-next-cursor'] == '00:02'
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines == [
+            {'dpid': '00:01', 'color_field': 'dl_src',
+             'color_value': 'ee:ee:ee:ee:ee:01'},
+            {'dpid': '00:02', 'color_field': 'dl_src',
+             'color_value': 'ee:ee:ee:ee:ee:02'},
+        ]
+
+    # pylint: disable=protected-access
+    def test_ndjson_colors(self):
+        """Test _ndjson_colors encodes the snapshot in chunks."""
+        snapshot = [(f'00:0{index}', index) for index in range(1, 4)]
+        with patch('napps.amlight.coloring.main.settings') as mock_settings:
+            mock_settings.COLORS_CHUNK_SIZE = 2
+            chunks = list(self.napp._ndjson_colors(snapshot))
+        assert len(chunks) == 2
+        lines = ''.join(chunks).splitlines()
+        assert [json.loads(line)['dpid'] for line in lines] == [
+            '00:01', '00:02', '00:03'
+        ]
+
+    # pylint: disable=protected-access
+    async def test_rest_pending_flows(self):
+        """ Test rest call to /flows/pending. """
+        match = {'dl_src': 'ee:ee:ee:ee:ee:02'}
+        self.napp._flow_tracker.sent('00:01', [{'match': match}])
+
+        endpoint = f"{self.base_endpoint}/flows/pending"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        flows = response.json()['flows']
+        assert len(flows) == 1
+        assert flows[0]['dpid'] == '00:01'
+        assert flows[0]['match'] == match
+        assert flows[0]['state'] == 'pending'
+        assert flows[0]['attempts'] == 1
+
+    async def test_rest_switch_color(self):
+        """ Test rest call to /colors/{dpid}. """
+        self.napp.switches = {'00:01': {'color': 300}}
+        endpoint = f"{self.base_endpoint}/colors/00:01"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert response.json() == {'color_field': 'dl_src',
+                                   'color_value': 'ee:ee:ee:ee:01:2c'}
+
+        endpoint = f"{self.base_endpoint}/colors/00:02"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 404
+
+    async def test_rest_aggregation(self):
+        """ Test rest call to /aggregation. """
+        self.napp.switches = {'00:01': {'color': 1, 'neighbors': {'00:02'},
+                                        'flows': {'00:02': {}}}}
+        endpoint = f"{self.base_endpoint}/aggregation"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert response.json() == {'switches': {'00:01': {
+            'neighbors': 1, 'entries': 1, 'saved': 0
+        }}}
+
+    async def test_rest_flow_mods_rate(self):
+        """ Test rest call to /flow_mods/rate. """
+        endpoint = f"{self.base_endpoint}/flow_mods/rate"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert response.json()['queue'] == 0
+
+    # pylint: disable=protected-access
+    async def test_rest_profiling(self):
+        """ Test rest calls to /profiling. """
+        endpoint = f"{self.base_endpoint}/profiling/profile"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 404
+
+        endpoint = f"{self.base_endpoint}/profiling"
+        response = await self.api_client.post(endpoint,
+                                              json={"invocations": 0})
+        assert response.status_code == 400
+        response = await self.api_client.post(endpoint,
+                                              json={"invocations": 1})
+        assert response.status_code == 201
+        assert response.json()['active']
+        response = await self.api_client.post(endpoint, json={})
+        assert response.status_code == 409
+
+        self.napp.switches = {'00:01': {'color': 1}}
+        assert self.napp._switch_colors()['00:01']['color_field'] == 'dl_src'
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        summary = response.json()
+        assert not summary['active']
+        assert summary['calls'] == 1
+        assert summary['handlers']['_switch_colors']['calls'] == 1
+        assert summary['lock_wait']['acquisitions'] == 1
+        assert '_switch_colors' not in vars(self.napp)
+
+        endpoint = f"{self.base_endpoint}/profiling/profile"
+        response = await self.api_client.get(endpoint)
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/octet-stream'
+
+        endpoint = f"{self.base_endpoint}/profiling"
+        response = await self.api_client.post(endpoint, json={})
+        assert response.status_code == 201
+        assert response.json()['seconds'] == 60
+        response = await self.api_client.delete(endpoint)
+        assert response.status_code == 200
+        assert not response.json()['active']
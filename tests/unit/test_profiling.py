@@ -0,0 +1,117 @@
+"""Test profiling.py."""
+import marshal
+from threading import Lock
+
+from napps.amlight.coloring.profiling import HandlerProfiler, TimedLock
+from tests.unit.helpers import FakeClock
+
+
+class Handlers:
+    """Object with handlers to profile."""
+
+    def __init__(self):
+        self._switches_lock = Lock()
+        self.handled = []
+
+    def handle(self, value: int) -> int:
+        """Handle a value under the lock."""
+        with self._switches_lock:
+            self.handled.append(value)
+        return self.inner(value)
+
+    def inner(self, value: int) -> int:
+        """Handler called by another handler."""
+        return value * 2
+
+
+def test_timed_lock() -> None:
+    """Test TimedLock counts acquisitions and still locks."""
+    lock = Lock()
+    timed_lock = TimedLock(lock)
+    with timed_lock:
+        assert lock.locked()
+    assert not lock.locked()
+    assert timed_lock.acquire(blocking=False)
+    assert not timed_lock.acquire(blocking=False)
+    timed_lock.release()
+    stats = timed_lock.stats()
+    assert stats['acquisitions'] == 3
+    assert stats['wait_total'] >= stats['wait_max'] >= 0
+
+
+class TestHandlerProfiler:
+    """Test the HandlerProfiler class."""
+
+    # pylint: disable=protected-access
+    def setup_method(self):
+        """Setup method."""
+        self.clock = FakeClock()
+        self.handlers = Handlers()
+        self.lock = self.handlers._switches_lock
+        self.profiler = HandlerProfiler(self.handlers, ['handle', 'inner'],
+                                        clock=self.clock)
+
+    # pylint: disable=protected-access
+    def test_start_stop(self):
+        """Test handlers are wrapped only while profiling."""
+        assert self.profiler.start(seconds=10)
+        assert not self.profiler.start(seconds=10)
+        assert 'handle' in vars(self.handlers)
+        assert isinstance(self.handlers._switches_lock, TimedLock)
+        assert self.handlers.handle(3) == 6
+        assert self.profiler.stop()
+        assert not self.profiler.stop()
+        assert 'handle' not in vars(self.handlers)
+        assert self.handlers._switches_lock is self.lock
+        assert self.handlers.handle(4) == 8
+        assert self.handlers.handled == [3, 4]
+
+        summary = self.profiler.summary()
+        assert not summary['active']
+        assert summary['calls'] == 1
+        assert summary['profiled_calls'] == 1
+        assert summary['handlers']['handle']['calls'] == 1
+        assert summary['handlers']['inner']['calls'] == 1
+        assert summary['lock_wait']['acquisitions'] == 1
+        functions = [entry['function'] for entry in summary['functions']]
+        assert any(function.endswith('(inner)') for function in functions)
+
+    def test_invocations(self):
+        """Test profiling stops after the outermost invocations."""
+        self.profiler.start(invocations=2)
+        self.handlers.handle(1)
+        assert self.profiler.active
+        self.handlers.handle(2)
+        assert not self.profiler.active
+        assert 'handle' not in vars(self.handlers)
+        assert self.profiler.summary()['calls'] == 2
+
+    def test_seconds(self):
+        """Test profiling stops after the seconds are over."""
+        self.profiler.start(seconds=5)
+        self.clock.now = 4
+        self.profiler.check()
+        assert self.profiler.active
+        self.clock.now = 5
+        assert not self.profiler.summary()['active']
+        assert self.profiler.summary()['elapsed'] == 5
+
+    def test_sample_every(self):
+        """Test only one every sample_every calls is profiled."""
+        self.profiler.start(seconds=10, sample_every=3)
+        for value in range(7):
+            self.handlers.inner(value)
+        summary = self.profiler.summary()
+        assert summary['calls'] == 7
+        assert summary['profiled_calls'] == 3
+        assert summary['handlers']['inner']['calls'] == 7
+
+    def test_profile_data(self):
+        """Test the profile is in the pstats format."""
+        assert self.profiler.profile_data() is None
+        self.profiler.start(seconds=10)
+        self.handlers.handle(1)
+        self.handlers.handle(2)
+        stats = marshal.loads(self.profiler.profile_data())
+        entries = {key[2]: entry for key, entry in stats.items()}
+        assert entries['inner'][1] == 2
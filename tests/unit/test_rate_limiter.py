@@ -0,0 +1,101 @@
+"""Test rate_limiter.py."""
+from napps.amlight.coloring.rate_limiter import FlowModRateLimiter, TokenBucket
+from tests.unit.helpers import FakeClock
+
+
+def make_flows(count: int) -> list[dict]:
+    """Build coloring flows."""
+    return [{"match": {"dl_src": index}} for index in range(count)]
+
+
+def test_token_bucket() -> None:
+    """Test TokenBucket refill and take."""
+    bucket = TokenBucket(rate=2, burst=4, now=0)
+    assert bucket.take(10) == 4
+    assert bucket.take(1) == 0
+    bucket.refill(1.2)
+    assert bucket.take(10) == 2
+    bucket.refill(100)
+    assert bucket.tokens == 4
+
+
+class TestFlowModRateLimiter:
+    """Test the FlowModRateLimiter class."""
+
+    def setup_method(self):
+        """Setup method."""
+        self.clock = FakeClock()
+        self.limiter = FlowModRateLimiter(clock=self.clock)
+
+    def test_dispatch(self):
+        """Test flow mods are released as the bucket allows."""
+        flows = make_flows(5)
+        self.limiter.submit("00:01", "install", True, flows, (1, 2))
+        assert self.limiter.dispatch() == [
+            ("00:01", "install", True, flows[:2])
+        ]
+        assert not self.limiter.dispatch()
+        status = self.limiter.status()
+        assert status["queue"] == 3
+        assert status["switches"]["00:01"]["queue"] == 3
+        assert status["switches"]["00:01"]["rate"] == 1
+
+        self.clock.now = 10
+        assert self.limiter.dispatch() == [
+            ("00:01", "install", True, flows[2:4])
+        ]
+        self.clock.now = 20
+        assert self.limiter.dispatch() == [
+            ("00:01", "install", True, flows[4:])
+        ]
+        assert self.limiter.status()["queue"] == 0
+
+    def test_dispatch_batches_actions(self):
+        """Test consecutive flow mods are batched per action."""
+        installs = make_flows(2)
+        deletes = [{"match": {"dl_src": 2}}]
+        self.limiter.submit("00:01", "install", True, installs, (1, 10))
+        self.limiter.submit("00:01", "delete", True, deletes, (1, 10))
+        assert self.limiter.dispatch() == [
+            ("00:01", "install", True, installs),
+            ("00:01", "delete", True, deletes),
+        ]
+
+    def test_delete_drops_queued_installs(self):
+        """Test a delete drops the queued installs of its matches."""
+        installs = make_flows(3)
+        self.limiter.submit("00:01", "install", True, installs[:1], (1, 1))
+        assert self.limiter.dispatch() == [
+            ("00:01", "install", True, installs[:1])
+        ]
+        self.limiter.submit("00:01", "install", True, installs, (1, 1))
+        self.limiter.submit("00:01", "delete", True, installs[1:2], (1, 1))
+        self.limiter.submit("00:01", "install", True, installs[1:2], (1, 1))
+        released = []
+        for second in range(1, 5):
+            self.clock.now = second
+            released.extend(self.limiter.dispatch())
+        assert released == [
+            ("00:01", "install", True, installs[:1]),
+            ("00:01", "install", True, installs[2:]),
+            ("00:01", "delete", True, installs[1:2]),
+            ("00:01", "install", True, installs[1:2]),
+        ]
+
+    def test_dispatch_round_robin(self):
+        """Test a slow switch doesn't hold back the others."""
+        slow = make_flows(100)
+        fast = make_flows(3)
+        self.limiter.submit("00:01", "install", True, slow, (0.1, 1))
+        self.limiter.submit("00:02", "install", True, fast, (100, 100))
+        assert self.limiter.dispatch() == [
+            ("00:01", "install", True, slow[:1]),
+            ("00:02", "install", True, fast),
+        ]
+        self.limiter.submit("00:02", "install", True, fast, (100, 100))
+        assert self.limiter.dispatch() == [
+            ("00:02", "install", True, fast),
+        ]
+        status = self.limiter.status()
+        assert status["switches"]["00:01"]["queue"] == 99
+        assert status["switches"]["00:02"]["queue"] == 0
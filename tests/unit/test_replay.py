@@ -0,0 +1,110 @@
+"""Test replay.py."""
+import gzip
+
+from kytos.core.common import EntityStatus
+
+from napps.amlight.coloring.replay import (EventRecorder, ReplayLink,
+                                           Replayer, ReplaySwitch,
+                                           load_events)
+from tests.unit.helpers import FakeClock
+
+
+def test_replay_switch_status() -> None:
+    """Test ReplaySwitch derives its status."""
+    switch = ReplaySwitch('00:01', '0x04', True, True)
+    assert switch.status == EntityStatus.UP
+    switch.active = False
+    assert switch.status == EntityStatus.DOWN
+    switch.enabled = False
+    assert switch.status == EntityStatus.DISABLED
+
+
+def test_record_and_load(tmp_path) -> None:
+    """Test recorded events are loaded back."""
+    path = str(tmp_path / 'trace.ndjson.gz')
+    clock = FakeClock()
+    recorder = EventRecorder(path, clock=clock)
+    switches = [ReplaySwitch('00:01', '0x04', True, True),
+                ReplaySwitch('00:02', '0x04', True, True)]
+    link = ReplayLink('00:01', '00:02', True)
+    recorder.topology_updated(switches, [link])
+    clock.now = 1.5
+    recorder.link_disabled(link)
+    recorder.switch_disabled('00:02')
+    recorder.close()
+    recorder.switch_disabled('00:03')
+
+    events = load_events(path)
+    assert events == [
+        {'t': 0.0, 'event': 'topology.updated',
+         'switches': [['00:01', '0x04', True, True],
+                      ['00:02', '0x04', True, True]],
+         'links': [['00:01', '00:02', True]]},
+        {'t': 1.5, 'event': 'link.disabled',
+         'link': ['00:01', '00:02', True]},
+        {'t': 1.5, 'event': 'switch.disabled', 'dpid': '00:02'},
+    ]
+
+
+def test_load_truncated(tmp_path) -> None:
+    """Test a trace cut short is read up to its last complete event."""
+    path = tmp_path / 'trace.ndjson.gz'
+    data = gzip.compress(
+        b'{"t":0,"event":"switch.disabled","dpid":"00:01"}\n'
+        b'{"t":1,"event":"switch.dis'
+    )
+    path.write_bytes(data[:-10])
+    events = load_events(str(path))
+    assert events == [{'t': 0, 'event': 'switch.disabled', 'dpid': '00:01'}]
+
+
+DPID1 = '00:00:00:00:00:00:00:01'
+DPID2 = '00:00:00:00:00:00:00:02'
+DPID3 = '00:00:00:00:00:00:00:03'
+
+
+def test_replay() -> None:
+    """Test a replay reproduces the flow mods of the events, with the link
+    disabled before the topology update."""
+    switches = [[DPID1, '0x04', True, True],
+                [DPID2, '0x04', True, True],
+                [DPID3, '0x01', True, True]]
+    events = [
+        {'t': 0, 'event': 'topology.updated', 'switches': switches,
+         'links': [[DPID1, DPID2, True], [DPID2, DPID3, True]]},
+        {'t': 1, 'event': 'link.disabled', 'link': [DPID1, DPID2, False]},
+        {'t': 2, 'event': 'topology.updated', 'switches': switches,
+         'links': [[DPID1, DPID2, False], [DPID2, DPID3, True]]},
+        {'t': 3, 'event': 'connection.lost', 'dpid': DPID1},
+        {'t': 4, 'event': 'handshake.completed',
+         'switch': [DPID1, '0x04', True, True]},
+        {'t': 5, 'event': 'switch.disabled', 'dpid': DPID1},
+        {'t': 6, 'event': 'enable_table', 'content': {'coloring': {}}},
+    ]
+    replayer = Replayer()
+    report = replayer.replay(events)
+
+    assert replayer.flow_mods == {'install': 3, 'delete': 2}
+    assert report['flow_mods'] == {'install': 3, 'delete': 2}
+    updated = report['events']['topology.updated']
+    assert updated['count'] == 2
+    assert updated['flow_mods'] == {'install': 3, 'delete': 0}
+    assert updated['max'] >= updated['p99'] >= updated['p50'] >= 0
+    assert report['events']['link.disabled']['flow_mods'] == {
+        'install': 0, 'delete': 2
+    }
+    assert report['events']['enable_table']['count'] == 1
+    assert DPID1 not in replayer.napp.switches
+    assert not replayer.switches[DPID1].enabled
+
+
+def test_replay_speed(monkeypatch) -> None:
+    """Test events are replayed at the given speed."""
+    delays = []
+    monkeypatch.setattr('napps.amlight.coloring.replay.time.sleep',
+                        delays.append)
+    events = [{'t': 0, 'event': 'switch.disabled', 'dpid': '00:01'},
+              {'t': 10, 'event': 'switch.disabled', 'dpid': '00:02'}]
+    Replayer().replay(events, speed=5)
+    assert len(delays) == 1
+    assert 1.5 < delays[0] <= 2
@@ -1,8 +1,29 @@
 """Test utils.py."""
+import random
+from unittest.mock import Mock
+
 import pytest
 
 
-from napps.amlight.coloring.utils import make_unicast_local_mac
+from napps.amlight.coloring.main import Main
+from napps.amlight.coloring.utils import (colors_to_field, dpids_to_colors,
+                                          field_color_valid, field_max_color,
+                                          fill_zero_bytes, link_dict_pairs,
+                                          link_pairs, mac_color_valid,
+                                          make_unicast_local_mac,
+                                          unicast_local_mac)
+
+FIELDS = ["dl_src", "dl_dst", "nw_src", "nw_dst", "in_port", "dl_vlan",
+          "tp_src", "tp_dst", "nw_tos", "nw_proto", "does_not_exist"]
+
+
+def random_colors(seed: int, size: int = 2000) -> list[int]:
+    """Random colors of different widths, plus the edge cases."""
+    rand = random.Random(seed)
+    colors = [rand.getrandbits(rand.choice([8, 16, 32, 48, 64]))
+              for _ in range(size)]
+    return colors + [0, 1, 0x0100, 0x10, 0xffffffffffff,
+                     0xffffffffffffffff, 0x010001000100]
 
 
 def test_make_unicast_local_mac_valid() -> None:
@@ -16,3 +37,109 @@ def test_make_unicast_local_mac_errors(mac) -> None:
     """test make_unicast_local_mac."""
     with pytest.raises(ValueError):
         assert make_unicast_local_mac(mac)
+
+
+def int_to_mac(value: int) -> str:
+    """Format a 48-bit integer as a MAC address."""
+    return value.to_bytes(6, "big").hex(":")
+
+
+def test_unicast_local_mac() -> None:
+    """test unicast_local_mac gives the same output as
+    make_unicast_local_mac.
+
+    Each byte is handled independently, so covering every value of every
+    byte position covers all the inputs."""
+    for position in range(6):
+        for byte in range(256):
+            for fill in (0x00, 0x5a, 0xff):
+                raw = [fill] * 6
+                raw[position] = byte
+                value = int.from_bytes(bytes(raw), "big")
+                mac = int_to_mac(value)
+                assert unicast_local_mac(value) == make_unicast_local_mac(mac)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fill_zero_bytes(seed) -> None:
+    """test fill_zero_bytes matches the '00' to 'ee' MAC substitution."""
+    for color in random_colors(seed):
+        mac = int_to_mac(color & 0xffffffffffff).replace("00", "ee")
+        assert int_to_mac(fill_zero_bytes(color)) == mac
+
+
+def test_mac_color_valid() -> None:
+    """Test colors with a 0xee byte are invalid on MAC fields."""
+    assert mac_color_valid(0x100)
+    assert not mac_color_valid(0x1ee)
+    assert not mac_color_valid(0xee0001)
+    assert field_color_valid("dl_dst") is mac_color_valid
+    assert field_color_valid("dl_vlan") is None
+    valid = [color for color in range(1, 0x20000) if mac_color_valid(color)]
+    macs = [Main.color_to_field(color, "dl_src") for color in valid]
+    assert len(set(macs)) == len(macs)
+
+
+def test_field_max_color() -> None:
+    """Test field_max_color."""
+    assert field_max_color("dl_src") == 0xffffffffff
+    assert field_max_color("nw_dst") == 0xffffffff
+    assert field_max_color("dl_vlan") == 0xffe
+    assert field_max_color("in_port") == 0xfeff
+    assert field_max_color("tp_src") == 0xffff
+    assert field_max_color("nw_tos") == 0x3f
+    assert field_max_color("nw_proto") == 0xff
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_dpids_to_colors(seed) -> None:
+    """test dpids_to_colors matches the scalar color of each dpid."""
+    rand = random.Random(seed)
+    dpids = [rand.getrandbits(64).to_bytes(8, "big").hex(":")
+             for _ in range(500)]
+    dpids.append("00:00:00:00:00:00:00:01")
+    assert dpids_to_colors(dpids) == [
+        int(dpid.replace(":", "")[4:], 16) for dpid in dpids
+    ]
+    assert not dpids_to_colors([])
+
+
+@pytest.mark.parametrize("field", FIELDS)
+@pytest.mark.parametrize("seed", range(5))
+def test_colors_to_field(field, seed) -> None:
+    """test colors_to_field matches Main.color_to_field for each color."""
+    colors = random_colors(seed)
+    assert colors_to_field(colors, field) == [
+        Main.color_to_field(color, field) for color in colors
+    ]
+
+
+def test_colors_to_field_empty() -> None:
+    """test colors_to_field without colors."""
+    assert not colors_to_field([], "dl_src")
+
+
+def test_link_pairs() -> None:
+    """test link_pairs reads the endpoints of enabled links only."""
+    links = []
+    for index, enabled in enumerate([True, False, True]):
+        link = Mock()
+        link.is_enabled.return_value = enabled
+        link.endpoint_a.switch.dpid = f"00:0{index}"
+        link.endpoint_b.switch.dpid = f"00:1{index}"
+        links.append(link)
+    assert list(link_pairs(links)) == [("00:00", "00:10"), ("00:02", "00:12")]
+    for link in links:
+        link.as_dict.assert_not_called()
+
+
+def test_link_dict_pairs() -> None:
+    """test link_dict_pairs."""
+    links = [
+        {"endpoint_a": {"switch": "00:01"}, "endpoint_b": {"switch": "00:02"},
+         "enabled": True},
+        {"endpoint_a": {"switch": "00:01"}, "endpoint_b": {"switch": "00:03"},
+         "enabled": False},
+        {"endpoint_a": {"switch": "00:02"}, "endpoint_b": {"switch": "00:03"}},
+    ]
+    assert list(link_dict_pairs(links)) == [("00:01", "00:02")]
@@ -1,5 +1,7 @@
 """Utilities."""
 import re
+import struct
+from typing import Callable, Iterable, Iterator, Optional
 
 MAC_ADDR = re.compile("([0-9A-Fa-f]{2}[-:]){5}[0-9A-Fa-f]{2}$")
 
@@ -15,3 +17,127 @@ def make_unicast_local_mac(mac: str) -> str:
         raise ValueError(msg)
     mac = mac.lower()
     return mac[:1] + "e" + mac[2:]
+
+
+def unicast_local_mac(value: int) -> str:
+    """Trusted fast path of make_unicast_local_mac.
+
+    It builds the unicast and locally administered MAC straight from its
+    48-bit integer, without validating or parsing any string.
+    """
+    value = (value & 0xf0ffffffffff) | 0x0e0000000000
+    return value.to_bytes(6, "big").hex(":")
+
+
+def fill_zero_bytes(value: int) -> int:
+    """Replace each zero byte of a 48-bit integer with 0xee."""
+    value &= 0xffffffffffff
+    # Only the high bit of the zero bytes is left set, with no carry
+    # between bytes
+    zeros = ~(((value & 0x7f7f7f7f7f7f) + 0x7f7f7f7f7f7f)
+              | value | 0x7f7f7f7f7f7f) & 0xffffffffffff
+    return value | (zeros >> 7) * 0xee
+
+
+# Zero bytes are replaced by 0xee, the first byte of each MAC is also made
+# unicast and locally administered, just like color_to_field does.
+_MAC_BYTES = bytes(b or 0xee for b in range(256))
+_MAC_FIRST_BYTES = bytes(((b or 0xee) & 0xf0) | 0x0e for b in range(256))
+
+
+# Largest color that each field holds without collisions, 0xff for the
+# other fields
+_FIELD_MAX_COLORS = {
+    # The low nibble of the first byte is overwritten by unicast_local_mac
+    "dl_src": 0xffffffffff,
+    "dl_dst": 0xffffffffff,
+    "nw_src": 0xffffffff,
+    "nw_dst": 0xffffffff,
+    # 12-bit VLAN IDs, 0xfff is reserved
+    "dl_vlan": 0xffe,
+    # Reserved ports start at 0xff00
+    "in_port": 0xfeff,
+    "tp_src": 0xffff,
+    "tp_dst": 0xffff,
+    # Only the 6 DSCP bits are matched
+    "nw_tos": 0x3f,
+}
+
+
+def field_max_color(field: str) -> int:
+    """Largest color that the given field holds without collisions."""
+    return _FIELD_MAX_COLORS.get(field, 0xff)
+
+
+def mac_color_valid(color: int) -> bool:
+    """Whether a color keeps its own MAC once its zero bytes are filled.
+
+    Zero bytes become 0xee, so colors with a 0xee byte are skipped to keep
+    the MACs of different colors different."""
+    return b"\xee" not in (color & 0xffffffffffff).to_bytes(6, "big")
+
+
+def field_color_valid(field: str) -> Optional[Callable[[int], bool]]:
+    """Predicate of the colors usable on the given field, None if all the
+    colors up to field_max_color are."""
+    if field in ("dl_src", "dl_dst"):
+        return mac_color_valid
+    return None
+
+
+def dpids_to_colors(dpids: list[str]) -> list[int]:
+    """Get the colors, the lower 48 bits, of many dpids in one pass."""
+    if not dpids:
+        return []
+    raw = bytes.fromhex("".join(dpids).replace(":", ""))
+    return [
+        value & 0xffffffffffff
+        for value in struct.unpack(f"!{len(dpids)}Q", raw)
+    ]
+
+
+def colors_to_field(colors: list[int], field: str = "dl_src") -> list:
+    """Encode many colors at once for the given field.
+
+    This is the batched version of Main.color_to_field, the output of each
+    color is the same as the scalar path.
+    """
+    if not colors:
+        return []
+    if field in ("dl_src", "dl_dst"):
+        buffer = bytearray(struct.pack(
+            f"!{len(colors)}Q", *(c & 0xffffffffffffffff for c in colors)
+        ))
+        del buffer[0::8]
+        del buffer[0::7]
+        buffer = buffer.translate(_MAC_BYTES)
+        buffer[0::6] = buffer[0::6].translate(_MAC_FIRST_BYTES)
+        macs = buffer.hex(":")
+        return [macs[i:i + 17] for i in range(0, len(macs), 18)]
+    if field in ("nw_src", "nw_dst"):
+        raw = struct.pack(
+            f"!{len(colors)}L", *(c & 0xffffffff for c in colors)
+        )
+        return [f"{a}.{b}.{c}.{d}" for a, b, c, d in
+                struct.iter_unpack("!4B", raw)]
+    if field in ("in_port", "dl_vlan", "tp_src", "tp_dst"):
+        return [c & 0xffff for c in colors]
+    return [c & 0xff for c in colors]
+
+
+def link_pairs(links: Iterable) -> Iterator[tuple[str, str]]:
+    """Project enabled Link objects into (dpid_a, dpid_b) pairs.
+
+    Only the needed attributes are read, the links aren't serialized.
+    """
+    for link in links:
+        if link.is_enabled():
+            yield link.endpoint_a.switch.dpid, link.endpoint_b.switch.dpid
+
+
+def link_dict_pairs(links: Iterable[dict]) -> Iterator[tuple[str, str]]:
+    """Project enabled link dicts into (dpid_a, dpid_b) pairs."""
+    for link in links:
+        if link.get("enabled") is not True:
+            continue
+        yield link["endpoint_a"]["switch"], link["endpoint_b"]["switch"]